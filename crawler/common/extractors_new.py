@@ -7,6 +7,8 @@ import aiohttp
 from datetime import datetime
 from typing import Dict, List, Optional, Any, Union
 
+from utils.deduplication import safe_md5
+
 # Try to import Playwright, but don't fail if not available
 try:
     from playwright.async_api import Page
@@ -290,8 +292,6 @@ class SinaFinanceNewsExtractor:
 
     def _generate_fingerprint(self, title: str, content: str, source: str) -> str:
         """生成内容指纹"""
-        from utils import safe_md5
-
         fingerprint_input = f"{title.strip()}|{content[:500].strip()}|{source}"
         return safe_md5(fingerprint_input)
 
@@ -383,8 +383,6 @@ class TonghuashunNewsExtractor(APIStockDataExtractor):
 
     def _generate_fingerprint(self, title: str, content: str, source: str) -> str:
         """生成内容指纹"""
-        from utils import safe_md5
-
         fingerprint_input = f"{title.strip()}|{content[:500].strip()}|{source}"
         return safe_md5(fingerprint_input)
 
@@ -467,8 +465,6 @@ class XueqiuNewsExtractor:
 
     def _generate_fingerprint(self, title: str, content: str, source: str) -> str:
         """生成内容指纹"""
-        from utils import safe_md5
-
         fingerprint_input = f"{title.strip()}|{content[:500].strip()}|{source}"
         return safe_md5(fingerprint_input)
 
@@ -557,8 +553,6 @@ class XueqiuCommentExtractor:
 
     def _generate_fingerprint(self, content: str, author: str, source: str) -> str:
         """生成内容指纹"""
-        from utils import safe_md5
-
         fingerprint_input = f"{content.strip()}|{author.strip()}|{source}"
         return safe_md5(fingerprint_input)
 
@@ -634,8 +628,6 @@ class TonghuashunAnnouncementExtractor(APIStockDataExtractor):
 
     def _generate_fingerprint(self, title: str, content: str, source: str) -> str:
         """生成内容指纹"""
-        from utils import safe_md5
-
         fingerprint_input = f"{title.strip()}|{content[:500].strip()}|{source}"
         return safe_md5(fingerprint_input)
 
@@ -728,7 +720,5 @@ class EastMoneyAnnouncementExtractor(APIStockDataExtractor):
 
     def _generate_fingerprint(self, title: str, content: str, source: str) -> str:
         """生成内容指纹"""
-        from utils import safe_md5
-
         fingerprint_input = f"{title.strip()}|{content[:500].strip()}|{source}"
         return safe_md5(fingerprint_input)
@@ -267,6 +267,8 @@ class MultiThreadHistoryCrawler:
     def load_stock_codes(self) -> List[str]:
         """加载所有股票代码"""
         with StockDatabase(self.db_path) as db:
+            # 启动消费者之前完成索引初始化
+            db.init_database()
             codes = db.get_all_stock_codes()
             print(f"📋 从数据库加载了 {len(codes)} 只股票")
             return codes
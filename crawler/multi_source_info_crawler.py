@@ -11,6 +11,7 @@ from typing import List, Dict, Optional, Any
 
 from utils.deduplication import DeduplicationManager
 from utils.incremental_crawler import IncrementalCrawler
+from utils.stock_database import StockDatabase
 from utils.data_saver import save_stock_info_data
 from utils.sentiment_calculator import calculate_overall_sentiment_score
 from crawler.common.llm_analyzer import LLMAnalyzer
@@ -30,8 +31,11 @@ class MultiSourceInfoCrawler:
 
     def __init__(self, db_path: str, progress_file: str = "crawl_progress.json"):
         self.db_path = db_path
-        self.dedup_manager = DeduplicationManager(db_path)
-        self.incremental_crawler = IncrementalCrawler(db_path)
+        # 去重和增量爬取共享同一个 StockDatabase 的线程内连接
+        self.db = StockDatabase(db_path)
+        self.db.init_database()
+        self.dedup_manager = DeduplicationManager(db_path, db=self.db)
+        self.incremental_crawler = IncrementalCrawler(db_path, db=self.db)
         self.llm_analyzer = LLMAnalyzer()
         self.monitor_manager = MonitorManager(db_path, progress_file)
         self.three_months_ago = (datetime.now() - timedelta(days=90)).strftime(
@@ -148,16 +152,20 @@ class MultiSourceInfoCrawler:
                     unique_comments, "comment"
                 )
 
-                if analyzed_news:
-                    save_stock_info_data(self.db_path, "stock_news", analyzed_news)
-                if analyzed_announcements:
-                    save_stock_info_data(
-                        self.db_path, "stock_announcements", analyzed_announcements
-                    )
-                if analyzed_comments:
-                    save_stock_info_data(
-                        self.db_path, "stock_comments", analyzed_comments
-                    )
+                for table_name, items in (
+                    ("stock_news", analyzed_news),
+                    ("stock_announcements", analyzed_announcements),
+                    ("stock_comments", analyzed_comments),
+                ):
+                    if not items:
+                        continue
+                    saved = save_stock_info_data(self.db_path, table_name, items)
+                    # 只记录确实写入的内容，保存失败或跳过的下次仍会重试
+                    for item in items:
+                        if item["fingerprint"] in saved:
+                            self.dedup_manager.add(
+                                item["fingerprint"], table_name, item.get("url")
+                            )
 
                 news_score = self._calculate_average_score(analyzed_news)
                 announcement_score = self._calculate_average_score(
@@ -239,9 +247,12 @@ class MultiSourceInfoCrawler:
     ) -> List[Dict]:
         """批量分析内容"""
         analyzed_items = []
+        table_name = (
+            "stock_news" if content_type == "news" else f"stock_{content_type}s"
+        )
         for item in items:
             if not self.dedup_manager.is_content_exists(
-                item["fingerprint"], f"stock_{content_type}s"
+                item["fingerprint"], table_name
             ):
                 analysis = self.llm_analyzer.analyze_content(
                     item["content"], content_type
@@ -326,6 +337,7 @@ class MultiSourceInfoCrawler:
                         scores[stock_code] = -1.0
                         self.monitor_manager.mark_stock_failed(stock_code, str(e))
 
+                self.monitor_manager.flush()
                 await browser.close()
                 await self.eastmoney_announcement_extractor.close_session()
                 await self.tonghuashun_news_extractor.close_session()
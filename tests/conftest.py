@@ -0,0 +1,42 @@
+"""测试公共配置"""
+
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+# 与 DATABASE_SCHEMA.md 一致的最小表结构
+_SCHEMA = """
+CREATE TABLE merged_stocks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    code TEXT, date TEXT,
+    open REAL, high REAL, low REAL, close REAL, volume INTEGER,
+    amount REAL, outstanding_share REAL, turnover REAL, name TEXT,
+    ma5 REAL, ma10 REAL, ma20 REAL, rsi6 REAL, rsi14 REAL, pct_change REAL
+);
+CREATE TABLE data_status (
+    code TEXT PRIMARY KEY, last_updated TIMESTAMP, record_count INTEGER, status TEXT
+);
+CREATE TABLE stock_news (
+    id INTEGER PRIMARY KEY, code TEXT NOT NULL, title TEXT NOT NULL,
+    content TEXT NOT NULL, source TEXT NOT NULL, publish_date TEXT NOT NULL,
+    url TEXT NOT NULL, fingerprint TEXT UNIQUE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    sentiment_score REAL, is_valid BOOLEAN DEFAULT 1, llm_analysis TEXT
+);
+"""
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """建好表结构的临时数据库路径"""
+    path = str(tmp_path / "stock.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(_SCHEMA)
+    conn.close()
+    return path
@@ -0,0 +1,48 @@
+"""数据保存模块测试"""
+
+import sqlite3
+import threading
+
+from utils.data_saver import save_stock_info_data
+
+
+def _news(thread_id: int, batch: int, size: int) -> list:
+    return [
+        {
+            "code": "000001",
+            "title": f"标题{thread_id}-{batch}-{i}",
+            "content": "内容",
+            "source": "test",
+            "publish_date": "2024-01-01",
+            "url": f"https://example.com/{thread_id}/{batch}/{i}",
+            "fingerprint": f"{thread_id}-{batch}-{i}",
+        }
+        for i in range(size)
+    ]
+
+
+def test_concurrent_saves_keep_every_row(db_path):
+    threads, batches, size = 4, 10, 500
+    saved = []
+    lock = threading.Lock()
+
+    def worker(thread_id: int):
+        for batch in range(batches):
+            fingerprints = save_stock_info_data(
+                db_path, "stock_news", _news(thread_id, batch, size)
+            )
+            with lock:
+                saved.append(len(fingerprints))
+
+    workers = [threading.Thread(target=worker, args=(t,)) for t in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+
+    assert saved == [size] * (threads * batches)
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT COUNT(*) FROM stock_news").fetchone()[0] == (
+        threads * batches * size
+    )
+    conn.close()
@@ -0,0 +1,46 @@
+"""增量爬取判断测试"""
+
+import sqlite3
+from datetime import datetime, timedelta
+
+from utils.incremental_crawler import IncrementalCrawler
+
+
+def test_ttl_checks_agree_across_timestamp_formats(db_path):
+    now = datetime.now()
+    recent = now - timedelta(minutes=30)
+    stale = now - timedelta(hours=3)
+    # 新闻的爬取间隔为2小时；同时覆盖 isoformat() 的 'T' 分隔和空格分隔的时间
+    rows = [
+        ("000001", recent.isoformat()),
+        ("000002", recent.strftime("%Y-%m-%d %H:%M:%S")),
+        ("000003", stale.isoformat()),
+        ("000004", stale.strftime("%Y-%m-%d %H:%M:%S")),
+        ("000005", None),
+    ]
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        """
+        CREATE TABLE crawl_status (
+            code TEXT, content_type TEXT, last_crawl_time TEXT,
+            total_count INTEGER, status TEXT, PRIMARY KEY (code, content_type)
+        )
+        """
+    )
+    conn.executemany(
+        "INSERT INTO crawl_status VALUES (?, 'news', ?, 0, 'active')", rows
+    )
+    conn.commit()
+    conn.close()
+
+    crawler = IncrementalCrawler(db_path)
+    codes = [code for code, _ in rows] + ["000006"]
+    expected = {"000003", "000004", "000005", "000006"}
+
+    assert crawler.should_crawl_batch(codes, "news") == expected
+    assert {code for code in codes if crawler.should_crawl_stock(code, "news")} == expected
+    plan = crawler.get_crawl_plan()
+    assert {
+        code for code in codes if plan.get(code, {}).get("news", True)
+    } == expected
+    crawler.close()
@@ -0,0 +1,62 @@
+"""监控管理器测试"""
+
+import os
+import sqlite3
+import subprocess
+import sys
+import textwrap
+
+
+def test_progress_log_survives_kill(db_path, tmp_path):
+    progress_file = str(tmp_path / "progress.json")
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    script = textwrap.dedent(
+        f"""
+        import os, sys
+        sys.path.insert(0, {repo_root!r})
+        from utils.monitor_manager import MonitorManager
+        manager = MonitorManager({db_path!r}, {progress_file!r})
+        for i in range(11):
+            manager.mark_stock_success(f"{{i:06d}}", 6.0)
+        manager.mark_stock_failed("000099", "timeout")
+        os._exit(9)  # 模拟进程被强制终止，不执行 atexit
+        """
+    )
+    subprocess.run([sys.executable, "-c", script], check=False)
+
+    from utils.monitor_manager import MonitorManager
+
+    manager = MonitorManager(db_path, progress_file)
+    status = manager.progress_data["stocks_status"]
+    assert len(status) == 12
+    assert status["000099"]["status"] == "failed"
+    assert manager.progress_data["successful_stocks"] == 11
+    manager.close()
+
+
+def test_stock_total_counted_only_on_refresh(db_path, tmp_path, monkeypatch):
+    from utils.monitor_manager import MonitorManager
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE IF NOT EXISTS stock_list (code TEXT PRIMARY KEY)")
+    conn.executemany("INSERT INTO stock_list VALUES (?)", [("000001",), ("000002",)])
+    conn.commit()
+    conn.close()
+
+    manager = MonitorManager(db_path, str(tmp_path / "progress.json"))
+    saves = []
+    save_progress = manager._save_progress
+
+    def counting_save(*args, **kwargs):
+        saves.append(1)
+        return save_progress(*args, **kwargs)
+
+    monkeypatch.setattr(manager, "_save_progress", counting_save)
+    for _ in range(3):
+        assert manager.get_stocks_to_process() == ["000001", "000002"]
+    assert manager.progress_data["total_stocks"] == 2
+    assert len(saves) == 1
+
+    manager.refresh_stock_list()
+    assert len(saves) == 2
+    manager.close()
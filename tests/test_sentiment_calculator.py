@@ -0,0 +1,34 @@
+"""情感评分计算测试"""
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from utils.sentiment_calculator import (
+    calculate_overall_sentiment_score,
+    calculate_overall_sentiment_scores_batch,
+)
+
+
+def test_batch_matches_scalar():
+    rng = np.random.default_rng(0)
+    scores = rng.uniform(0, 10, (20000, 4))
+    # 一位小数的评分在加权后容易落在 x.xx5，用于覆盖舍入的边界情况
+    scores[:10000] = np.round(scores[:10000], 1)
+    scores[rng.random(scores.shape) < 0.3] = np.nan
+
+    batch = calculate_overall_sentiment_scores_batch(*scores.T)
+    expected = [
+        calculate_overall_sentiment_score(
+            *(None if np.isnan(value) else float(value) for value in row)
+        )
+        for row in scores
+    ]
+    # np.round 与内置 round 在 x.xx5 边界上的舍入方向可能不同，最多相差 0.01
+    assert np.abs(batch - np.array(expected)).max() <= 0.01 + 1e-9
+
+
+def test_batch_all_missing_is_neutral():
+    missing = np.full(3, np.nan)
+    result = calculate_overall_sentiment_scores_batch(missing, missing, missing, missing)
+    assert result.tolist() == [5.0, 5.0, 5.0]
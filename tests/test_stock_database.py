@@ -0,0 +1,72 @@
+"""StockDatabase 测试"""
+
+import threading
+
+import pytest
+
+from utils.stock_database import StockDatabase
+
+
+def test_export_to_parquet_round_trip(db_path, tmp_path):
+    pytest.importorskip("pyarrow")
+
+    db = StockDatabase(db_path)
+    rows = [
+        {"code": code, "date": f"2024-01-0{day}", "close": 10.0 + day,
+         "ma5": 1500.37 + day, "ma10": None, "rsi6": 55.5}
+        for code in ("000001", "600000")
+        for day in (3, 1, 2)
+    ]
+    assert db.insert_stock_data_batch(rows)
+
+    path = str(tmp_path / "indicators")
+    assert db.export_to_parquet(path, batch_size=2) == len(rows)
+
+    table = db.scan_indicators("000001", path)
+    assert table.column("code").to_pylist() == ["000001"] * 3
+    assert table.column("date").to_pylist() == ["2024-01-01", "2024-01-02", "2024-01-03"]
+    assert table.column("ma5").to_pylist() == [1501.37, 1502.37, 1503.37]
+    assert table.column("ma10").to_pylist() == [None] * 3
+    db.close_connection()
+
+
+def _index_names(db):
+    rows = db.get_connection().execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'idx_%'"
+    ).fetchall()
+    return {row[0] for row in rows}
+
+
+def test_indexes_created_only_by_init_database(db_path):
+    db = StockDatabase(db_path)
+    conn = db.get_connection()
+    conn.execute("CREATE INDEX idx_merged_stocks_date ON merged_stocks (date)")
+    conn.commit()
+    # 读路径不修改表结构
+    assert db.get_all_stock_codes() == []
+    assert _index_names(db) == {"idx_merged_stocks_date"}
+
+    assert db.init_database()
+    assert _index_names(db) == {
+        "idx_news_fingerprint", "idx_merged_date_code", "idx_merged_ohlcv"
+    }
+    db.close_connection()
+
+
+def test_async_submit_does_not_wait_for_write_lock(db_path):
+    db = StockDatabase(db_path)
+    submitted = threading.Event()
+
+    def submit():
+        db.insert_stock_data_batch_async([{"code": "000001", "date": "2024-01-01"}])
+        submitted.set()
+
+    # 模拟其他线程正在执行长时间的写事务
+    with db.transaction():
+        thread = threading.Thread(target=submit)
+        thread.start()
+        assert submitted.wait(timeout=2)
+    thread.join()
+    db.shutdown_writer()
+    assert db.get_stock_data_count() == 1
+    db.close_connection()
@@ -1,11 +1,14 @@
 #!/usr/bin/env python3
 """akshare股票数据获取模块"""
 
+import asyncio
 import akshare as ak
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 import logging
 import time
+from pathlib import Path
 from typing import Dict, List, Optional
 
 # 配置日志
@@ -14,12 +17,27 @@ logger = logging.getLogger(__name__)
 class AkshareDataFetcher:
     """akshare数据获取器"""
     
+    # 实时行情表中各字段的候选列名
+    _SPOT_COLUMNS = {
+        "open": ['今开', 'open'],
+        "high": ['最高', 'high'],
+        "low": ['最低', 'low'],
+        "close": ['最新价', 'close'],
+        "volume": ['成交量', 'volume'],
+        "amount": ['成交额', 'amount'],
+        "change": ['涨跌额', 'change'],
+        "change_percent": ['涨跌幅', 'change_percent'],
+    }
+    
     def __init__(self):
         self.name = "Akshare"
         self.enabled = True
         self.weight = 0.8  # akshare权重较高，因为数据质量更好
         self.max_retries = 3
         self.retry_delay = 1
+        # 历史日线本地缓存目录（已收盘的历史K线不会再变化）
+        self.history_cache_dir = Path.home() / ".cache" / "stock_scraper" / "hist"
+        self.history_cache_years = 5
         
     def get_real_time_price(self, stock_code: str) -> Optional[Dict]:
         """
@@ -27,52 +45,93 @@ class AkshareDataFetcher:
         """
         for attempt in range(self.max_retries):
             try:
-                # 转换股票代码格式
-                formatted_code = self._format_stock_code(stock_code)
-                if not formatted_code:
-                    return None
-                    
-                # 获取实时行情数据
-                stock_zh_a_spot_em_df = ak.stock_zh_a_spot_em()
-                
-                # 查找对应股票
-                stock_data = stock_zh_a_spot_em_df[
-                    stock_zh_a_spot_em_df['代码'] == formatted_code
-                ]
+                return self._fetch_real_time_price(stock_code)
                 
-                if stock_data.empty:
-                    logger.warning(f"未找到股票 {stock_code} 的实时数据")
+            except Exception as e:
+                logger.warning(f"akshare获取 {stock_code} 实时数据第{attempt+1}次尝试失败: {e}")
+                if attempt < self.max_retries - 1:
+                    time.sleep(self.retry_delay * (attempt + 1))
+                else:
+                    logger.error(f"❌ akshare获取 {stock_code} 实时数据最终失败: {e}")
                     return None
-                    
-                row = stock_data.iloc[0]
-                
-                # 构造返回数据
-                result = {
-                    "code": stock_code,
-                    "name": row['名称'],
-                    "date": datetime.now().strftime("%Y-%m-%d"),
-                    "open": float(row['今开']) if pd.notna(row['今开']) else None,
-                    "high": float(row['最高']) if pd.notna(row['最高']) else None,
-                    "low": float(row['最低']) if pd.notna(row['最低']) else None,
-                    "close": float(row['最新价']) if pd.notna(row['最新价']) else None,
-                    "volume": int(row['成交量']) if pd.notna(row['成交量']) else None,
-                    "amount": float(row['成交额']) if pd.notna(row['成交额']) else None,
-                    "change": float(row['涨跌额']) if pd.notna(row['涨跌额']) else None,
-                    "change_percent": float(row['涨跌幅']) if pd.notna(row['涨跌幅']) else None,
-                    "source": "akshare"
-                }
-                
-                logger.info(f"✅ akshare获取 {stock_code} 实时数据成功")
-                return result
+    
+    async def get_real_time_price_async(self, stock_code: str) -> Optional[Dict]:
+        """
+        异步获取股票实时价格数据
+        请求在线程中执行，重试等待期间让出事件循环
+        """
+        for attempt in range(self.max_retries):
+            try:
+                return await asyncio.to_thread(self._fetch_real_time_price, stock_code)
                 
             except Exception as e:
                 logger.warning(f"akshare获取 {stock_code} 实时数据第{attempt+1}次尝试失败: {e}")
                 if attempt < self.max_retries - 1:
-                    time.sleep(self.retry_delay * (attempt + 1))
+                    await asyncio.sleep(self.retry_delay * (attempt + 1))
                 else:
                     logger.error(f"❌ akshare获取 {stock_code} 实时数据最终失败: {e}")
                     return None
     
+    async def get_batch_real_time_prices_async(self, stock_codes: List[str]) -> List[Dict]:
+        """
+        异步获取多只股票的实时价格数据
+        只请求一次全市场行情并按代码筛选，重试等待期间让出事件循环
+        """
+        if not stock_codes:
+            return []
+        
+        for attempt in range(self.max_retries):
+            try:
+                return await asyncio.to_thread(self._fetch_batch_real_time_prices, stock_codes)
+                
+            except Exception as e:
+                logger.warning(f"akshare批量获取数据第{attempt+1}次尝试失败: {e}")
+                if attempt < self.max_retries - 1:
+                    await asyncio.sleep(self.retry_delay * (attempt + 1))
+                else:
+                    logger.error(f"❌ akshare批量获取数据最终失败: {e}")
+                    return []
+    
+    def _fetch_real_time_price(self, stock_code: str) -> Optional[Dict]:
+        """单次获取股票实时价格数据（不重试）"""
+        # 转换股票代码格式
+        formatted_code = self._format_stock_code(stock_code)
+        if not formatted_code:
+            return None
+            
+        # 获取实时行情数据
+        stock_zh_a_spot_em_df = ak.stock_zh_a_spot_em()
+        
+        # 查找对应股票
+        stock_data = stock_zh_a_spot_em_df[
+            stock_zh_a_spot_em_df['代码'] == formatted_code
+        ]
+        
+        if stock_data.empty:
+            logger.warning(f"未找到股票 {stock_code} 的实时数据")
+            return None
+            
+        row = stock_data.iloc[0]
+        
+        # 构造返回数据
+        result = {
+            "code": stock_code,
+            "name": row['名称'],
+            "date": datetime.now().strftime("%Y-%m-%d"),
+            "open": float(row['今开']) if pd.notna(row['今开']) else None,
+            "high": float(row['最高']) if pd.notna(row['最高']) else None,
+            "low": float(row['最低']) if pd.notna(row['最低']) else None,
+            "close": float(row['最新价']) if pd.notna(row['最新价']) else None,
+            "volume": int(row['成交量']) if pd.notna(row['成交量']) else None,
+            "amount": float(row['成交额']) if pd.notna(row['成交额']) else None,
+            "change": float(row['涨跌额']) if pd.notna(row['涨跌额']) else None,
+            "change_percent": float(row['涨跌幅']) if pd.notna(row['涨跌幅']) else None,
+            "source": "akshare"
+        }
+        
+        logger.info(f"✅ akshare获取 {stock_code} 实时数据成功")
+        return result
+    
     def get_historical_price(self, stock_code: str, target_date: str) -> Optional[Dict]:
         """
         获取股票历史价格数据 - 增强版
@@ -87,31 +146,28 @@ class AkshareDataFetcher:
                 # 转换日期格式
                 target_dt = datetime.strptime(target_date, "%Y-%m-%d")
                 
-                # 尝试多种历史数据获取方式
+                # 按优先级逐个尝试历史数据获取方式，取得结果后不再请求其余接口
+                # （标准接口优先读取本地缓存，多数情况下无需访问网络）
                 historical_data = None
-                
-                # 方法1: 使用标准历史行情接口
-                try:
-                    logger.info(f"📡 尝试标准历史接口获取 {stock_code} 数据...")
-                    historical_data = self._fetch_standard_history(formatted_code, target_dt)
-                except Exception as e:
-                    logger.warning(f"标准历史接口失败: {e}")
-                
-                # 方法2: 使用分钟数据接口获取日线数据
-                if historical_data is None:
-                    try:
-                        logger.info(f"🔄 尝试分钟数据接口获取 {stock_code} 数据...")
-                        historical_data = self._fetch_minute_to_daily(formatted_code, target_dt)
-                    except Exception as e:
-                        logger.warning(f"分钟数据接口失败: {e}")
-                
-                # 方法3: 使用实时数据作为当日历史数据的备选
-                if historical_data is None and target_date == datetime.now().strftime("%Y-%m-%d"):
+                fetchers = [
+                    ("标准历史接口", self._fetch_standard_history, target_dt),
+                    ("分钟数据接口", self._fetch_minute_to_daily, target_dt),
+                ]
+                # 使用实时数据作为当日历史数据的备选
+                if target_date == datetime.now().strftime("%Y-%m-%d"):
+                    fetchers.append(
+                        ("当日实时数据", self._fetch_today_as_history, target_date)
+                    )
+
+                for name, fetch, arg in fetchers:
                     try:
-                        logger.info(f"🔄 使用实时数据作为当日历史数据...")
-                        historical_data = self._fetch_today_as_history(formatted_code, target_date)
+                        logger.info(f"📡 尝试{name}获取 {stock_code} 数据...")
+                        historical_data = fetch(formatted_code, arg)
                     except Exception as e:
-                        logger.warning(f"当日数据获取失败: {e}")
+                        logger.warning(f"{name}失败: {e}")
+                        continue
+                    if historical_data is not None:
+                        break
                 
                 if historical_data is None:
                     logger.warning(f"未能获取 {stock_code} 在 {target_date} 的历史数据")
@@ -147,10 +203,6 @@ class AkshareDataFetcher:
     def _fetch_standard_history(self, formatted_code: str, target_dt: datetime) -> Optional[Dict]:
         """使用标准历史行情接口获取数据"""
         try:
-            # 获取历史行情数据（获取前后几天的数据以确保能找到目标日期）
-            start_date = (target_dt - timedelta(days=15)).strftime("%Y%m%d")
-            end_date = (target_dt + timedelta(days=15)).strftime("%Y%m%d")
-            
             # 尝试不同的参数组合
             param_combinations = [
                 {"period": "daily", "adjust": ""},
@@ -160,18 +212,13 @@ class AkshareDataFetcher:
             
             for params in param_combinations:
                 try:
-                    stock_zh_a_hist_df = ak.stock_zh_a_hist(
-                        symbol=formatted_code,
-                        period=params["period"],
-                        start_date=start_date,
-                        end_date=end_date,
-                        adjust=params["adjust"]
+                    stock_zh_a_hist_df = self._get_cached_history(
+                        formatted_code, params["adjust"], target_dt
                     )
                     
-                    if not stock_zh_a_hist_df.empty:
+                    if stock_zh_a_hist_df is not None and not stock_zh_a_hist_df.empty:
                         # 查找目标日期的数据
-                        if '日期' in stock_zh_a_hist_df.columns:
-                            stock_zh_a_hist_df['date'] = pd.to_datetime(stock_zh_a_hist_df['日期'])
+                        if 'date' in stock_zh_a_hist_df.columns:
                             target_data = stock_zh_a_hist_df[
                                 stock_zh_a_hist_df['date'] == target_dt
                             ]
@@ -199,6 +246,73 @@ class AkshareDataFetcher:
             logger.debug(f"标准历史接口获取失败: {e}")
             return None
     
+    def _get_cached_history(self, formatted_code: str, adjust: str, target_dt: datetime) -> Optional[pd.DataFrame]:
+        """
+        获取包含目标日期的历史日线数据，优先读取本地parquet缓存
+        缓存未覆盖目标日期时，只补拉缺少的时间段并合并写回缓存
+        """
+        cache_path = self.history_cache_dir / f"{formatted_code}_{adjust or 'none'}.parquet"
+        
+        cached = None
+        if cache_path.exists():
+            try:
+                cached = pd.read_parquet(cache_path)
+            except Exception as e:
+                logger.debug(f"读取历史缓存 {cache_path} 失败: {e}")
+        
+        now = datetime.now()
+        today = pd.Timestamp(now.date())
+        if cached is not None and not cached.empty:
+            cached_min, cached_max = cached['date'].min(), cached['date'].max()
+            if cached_min <= target_dt <= cached_max:
+                return cached
+            # 缓存未覆盖目标日期：只补拉缓存范围之外缺少的部分
+            if target_dt > cached_max:
+                start_dt = cached_max + timedelta(days=1)
+                end_dt = max(target_dt, now)
+            else:
+                start_dt = target_dt - timedelta(days=15)
+                end_dt = cached_min - timedelta(days=1)
+        elif target_dt >= today:
+            # 当日K线不会写入缓存，只取目标日期前后的小窗口，避免每次拉取多年数据
+            start_dt = target_dt - timedelta(days=15)
+            end_dt = target_dt + timedelta(days=15)
+        else:
+            # 首次缓存：获取最近若干年及目标日期前后的数据
+            start_dt = min(target_dt - timedelta(days=15), now - timedelta(days=365 * self.history_cache_years))
+            end_dt = max(target_dt + timedelta(days=15), now)
+        
+        stock_zh_a_hist_df = ak.stock_zh_a_hist(
+            symbol=formatted_code,
+            period="daily",
+            start_date=start_dt.strftime("%Y%m%d"),
+            end_date=end_dt.strftime("%Y%m%d"),
+            adjust=adjust
+        )
+        
+        if stock_zh_a_hist_df.empty or '日期' not in stock_zh_a_hist_df.columns:
+            return cached if cached is not None else stock_zh_a_hist_df
+        
+        stock_zh_a_hist_df['date'] = pd.to_datetime(stock_zh_a_hist_df['日期'])
+        if cached is not None and not cached.empty:
+            stock_zh_a_hist_df = (
+                pd.concat([cached, stock_zh_a_hist_df], ignore_index=True)
+                .drop_duplicates(subset='date', keep='last')
+                .sort_values('date')
+                .reset_index(drop=True)
+            )
+        
+        # 当日K线可能尚未收盘，不写入缓存
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            stock_zh_a_hist_df[stock_zh_a_hist_df['date'] < today].to_parquet(
+                cache_path, compression='zstd', index=False
+            )
+        except Exception as e:
+            logger.debug(f"写入历史缓存 {cache_path} 失败: {e}")
+        
+        return stock_zh_a_hist_df
+    
     def _fetch_minute_to_daily(self, formatted_code: str, target_dt: datetime) -> Optional[Dict]:
         """通过分钟数据聚合获取日线数据"""
         try:
@@ -216,24 +330,40 @@ class AkshareDataFetcher:
             if minute_data.empty:
                 return None
             
+            # 预先确定实际存在的列名，每个统计量只对一列做一次归约
+            columns = minute_data.columns
+            open_col = self._resolve_column(columns, ['开盘', 'open'])
+            close_col = self._resolve_column(columns, ['收盘', 'close'])
+            high_col = self._resolve_column(columns, ['最高', 'high'])
+            low_col = self._resolve_column(columns, ['最低', 'low'])
+            vol_col = self._resolve_column(columns, ['成交量', 'volume'])
+            amt_col = self._resolve_column(columns, ['成交额', 'amount'])
+            
+            # 一次性转换为float64矩阵，直接在numpy数组上归约，避免逐列的pandas调度开销
+            present = [
+                col for col in (open_col, high_col, low_col, close_col, vol_col, amt_col) if col
+            ]
+            values = minute_data[present].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float64)
+            column = {col: values[:, i] for i, col in enumerate(present)}
+            
             # 聚合分钟数据为日线数据
-            open_price = self._safe_float(minute_data.iloc[0], ['开盘', 'open'])
-            close_price = self._safe_float(minute_data.iloc[-1], ['收盘', 'close'])
+            open_price = column[open_col][0] if open_col else None
+            close_price = column[close_col][-1] if close_col else None
             
-            high_price = minute_data[['最高', 'high']].max().max() if '最高' in minute_data.columns else close_price
-            low_price = minute_data[['最低', 'low']].min().min() if '最低' in minute_data.columns else close_price
+            high_price = np.nanmax(column[high_col]) if high_col else close_price
+            low_price = np.nanmin(column[low_col]) if low_col else close_price
             
-            volume = minute_data[['成交量', 'volume']].sum().sum() if '成交量' in minute_data.columns else None
-            amount = minute_data[['成交额', 'amount']].sum().sum() if '成交额' in minute_data.columns else None
+            volume = np.nansum(column[vol_col]) if vol_col else None
+            amount = np.nansum(column[amt_col]) if amt_col else None
             
             return {
                 "name": None,
-                "open": float(open_price) if open_price else None,
-                "high": float(high_price) if high_price else None,
-                "low": float(low_price) if low_price else None,
-                "close": float(close_price) if close_price else None,
-                "volume": int(volume) if volume else None,
-                "amount": float(amount) if amount else None,
+                "open": float(open_price) if pd.notna(open_price) and open_price else None,
+                "high": float(high_price) if pd.notna(high_price) and high_price else None,
+                "low": float(low_price) if pd.notna(low_price) and low_price else None,
+                "close": float(close_price) if pd.notna(close_price) and close_price else None,
+                "volume": int(volume) if pd.notna(volume) and volume else None,
+                "amount": float(amount) if pd.notna(amount) and amount else None,
                 "change": None,
                 "change_percent": None,
             }
@@ -271,50 +401,72 @@ class AkshareDataFetcher:
         """
         批量获取实时价格数据
         """
-        results = []
+        if not stock_codes:
+            return []
         
         try:
-            # 获取所有A股实时行情
-            stock_zh_a_spot_em_df = ak.stock_zh_a_spot_em()
-            
-            # 创建代码映射
-            code_mapping = {}
-            for original_code in stock_codes:
-                formatted_code = self._format_stock_code(original_code)
-                if formatted_code:
-                    code_mapping[formatted_code] = original_code
-            
-            # 筛选需要的股票
-            filtered_data = stock_zh_a_spot_em_df[
-                stock_zh_a_spot_em_df['代码'].isin(code_mapping.keys())
-            ]
-            
-            # 转换为标准格式
-            for _, row in filtered_data.iterrows():
-                formatted_code = row['代码']
-                original_code = code_mapping[formatted_code]
-                
-                result = {
-                    "code": original_code,
-                    "name": row['名称'],
-                    "date": datetime.now().strftime("%Y-%m-%d"),
-                    "open": self._safe_float(row, ['今开', 'open']),
-                    "high": self._safe_float(row, ['最高', 'high']),
-                    "low": self._safe_float(row, ['最低', 'low']),
-                    "close": self._safe_float(row, ['最新价', 'close']),
-                    "volume": self._safe_int(row, ['成交量', 'volume']),
-                    "amount": self._safe_float(row, ['成交额', 'amount']),
-                    "change": self._safe_float(row, ['涨跌额', 'change']),
-                    "change_percent": self._safe_float(row, ['涨跌幅', 'change_percent']),
-                    "source": "akshare"
-                }
-                
-                results.append(result)
-                logger.info(f"✅ akshare获取 {original_code} 数据成功")
+            return self._fetch_batch_real_time_prices(stock_codes)
                 
         except Exception as e:
             logger.error(f"❌ akshare批量获取数据失败: {e}")
-            
+            logger.info("🔄 批量接口暂不可用，稍后重试...")
+            return self.get_batch_real_time_prices_fallback(stock_codes)
+
+    def get_batch_real_time_prices_fallback(self, stock_codes: List[str]) -> List[Dict]:
+        """
+        批量接口失败后的重试
+        逐只获取同样要下载整张全市场行情表，因此这里仍只重试一次批量请求并按代码筛选
+        """
+        for attempt in range(1, self.max_retries):
+            time.sleep(self.retry_delay * attempt)
+            try:
+                return self._fetch_batch_real_time_prices(stock_codes)
+                
+            except Exception as e:
+                logger.warning(f"akshare批量获取数据第{attempt+1}次尝试失败: {e}")
+        
+        logger.error("❌ akshare批量获取数据最终失败")
+        return []
+    
+    def _fetch_batch_real_time_prices(self, stock_codes: List[str]) -> List[Dict]:
+        """单次获取多只股票的实时价格数据（不重试）"""
+        results = []
+        
+        # 获取所有A股实时行情
+        stock_zh_a_spot_em_df = ak.stock_zh_a_spot_em()
+        
+        # 创建代码映射
+        code_mapping = self._format_stock_codes(stock_codes)
+        
+        # 筛选需要的股票
+        filtered_data = stock_zh_a_spot_em_df[
+            stock_zh_a_spot_em_df['代码'].isin(code_mapping.keys())
+        ]
+        
+        # 转换为标准格式：整列转换为数值，缺失值统一替换为None
+        today_str = datetime.now().strftime("%Y-%m-%d")
+        columns = filtered_data.columns
+        numeric = pd.DataFrame(index=filtered_data.index)
+        for field, column_names in self._SPOT_COLUMNS.items():
+            col_name = self._resolve_column(columns, column_names)
+            numeric[field] = (
+                pd.to_numeric(filtered_data[col_name], errors='coerce')
+                if col_name else np.nan
+            )
+        numeric['volume'] = np.trunc(numeric['volume']).astype('Int64')
+        records = numeric.astype(object).where(numeric.notna(), None).to_dict('records')
+        
+        for formatted_code, name, values in zip(filtered_data['代码'], filtered_data['名称'], records):
+            original_code = code_mapping[formatted_code]
+            results.append({
+                "code": original_code,
+                "name": name,
+                "date": today_str,
+                **values,
+                "source": "akshare"
+            })
+            logger.info(f"✅ akshare获取 {original_code} 数据成功")
+        
         return results
     
     def _format_stock_code(self, stock_code: str) -> Optional[str]:
@@ -338,25 +490,49 @@ class AkshareDataFetcher:
             logger.error(f"股票代码格式化错误 {stock_code}: {e}")
             return None
     
-    def _safe_float(self, row, column_names):
-        """安全地转换为浮点数"""
+    @staticmethod
+    def _format_stock_codes(stock_codes: List[str]) -> Dict[str, str]:
+        """
+        批量格式化股票代码，返回 {6位代码: 原始代码} 映射
+        与 _format_stock_code 规则一致，但在整列上向量化执行
+        """
+        if not stock_codes:
+            return {}
+        
+        codes = pd.Series(stock_codes, dtype="object").astype(str)
+        cleaned = codes.str.replace(r'^(sh|sz)', '', regex=True)
+        valid = cleaned.str.fullmatch(r'\d{6}')
+        
+        if not valid.all():
+            logger.error(f"无效的股票代码格式: {codes[~valid].tolist()}")
+        
+        return dict(zip(cleaned[valid], codes[valid]))
+    
+    @staticmethod
+    def _resolve_column(columns, column_names) -> Optional[str]:
+        """返回候选列名中第一个实际存在的列"""
         for col_name in column_names:
-            if col_name in row and pd.notna(row[col_name]):
-                try:
-                    return float(row[col_name])
-                except (ValueError, TypeError):
-                    continue
+            if col_name in columns:
+                return col_name
         return None
     
+    def _safe_float(self, row, column_names):
+        """安全地转换为浮点数（单行使用，批量请在整列上转换）"""
+        col_name = self._resolve_column(row.index, column_names)
+        val = row.get(col_name) if col_name else None
+        try:
+            return float(val) if pd.notna(val) else None
+        except (ValueError, TypeError):
+            return None
+    
     def _safe_int(self, row, column_names):
-        """安全地转换为整数"""
-        for col_name in column_names:
-            if col_name in row and pd.notna(row[col_name]):
-                try:
-                    return int(row[col_name])
-                except (ValueError, TypeError):
-                    continue
-        return None
+        """安全地转换为整数（单行使用，批量请在整列上转换）"""
+        col_name = self._resolve_column(row.index, column_names)
+        val = row.get(col_name) if col_name else None
+        try:
+            return int(val) if pd.notna(val) else None
+        except (ValueError, TypeError):
+            return None
 
 # 导出函数供外部使用
 def get_akshare_real_time(stock_code: str) -> Optional[Dict]:
@@ -3,8 +3,51 @@
 
 import sqlite3
 import sys
+import time
 from datetime import datetime, date
 
+DB_PATH = "/Users/riching/work/hywork/db/sqlite/full_a_stock_cache.db"
+
+# 统计结果缓存 {(数据库路径, 日期): (查询时间, 结果)}，超过有效期后重新查询
+_COUNTS_CACHE_TTL = 30.0
+_counts_cache = {}
+
+
+def _query_update_counts(db_path: str, target_date: str) -> tuple:
+    """一次查询获取总股票数和指定日期的已更新股票数（结果缓存 _COUNTS_CACHE_TTL 秒）
+
+    按日期统计使用 StockDatabase 建立的 idx_merged_date_code 索引，读路径上不再建索引。
+    """
+    key = (db_path, target_date)
+    now = time.monotonic()
+    cached = _counts_cache.get(key)
+    if cached is not None and now - cached[0] < _COUNTS_CACHE_TTL:
+        return cached[1]
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute(
+            """
+            SELECT
+                (SELECT COUNT(*) FROM stock_list),
+                (SELECT COUNT(*) FROM merged_stocks WHERE date = ?)
+            """,
+            (target_date,),
+        )
+        counts = cursor.fetchone()
+    finally:
+        conn.close()
+
+    _counts_cache[key] = (now, counts)
+    return counts
+
+
+def clear_update_status_cache():
+    """清空更新状态的统计缓存，下次检查时重新查询数据库"""
+    _counts_cache.clear()
+
 
 def check_update_status(target_date=None) -> dict:
     """
@@ -19,41 +62,25 @@ def check_update_status(target_date=None) -> dict:
     if target_date is None:
         target_date = date.today().strftime("%Y-%m-%d")
 
-    db_path = "/Users/riching/work/hywork/db/sqlite/full_a_stock_cache.db"
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-
-    try:
-        # 获取总股票数量
-        cursor.execute("SELECT COUNT(*) FROM stock_list")
-        total_stocks = cursor.fetchone()[0]
-
-        # 获取指定日期的已更新股票数量
-        cursor.execute(
-            "SELECT COUNT(*) FROM merged_stocks WHERE date = ?", (target_date,)
-        )
-        updated_stocks = cursor.fetchone()[0]
+    total_stocks, updated_stocks = _query_update_counts(DB_PATH, target_date)
 
-        # 计算完成率
-        completion_rate = updated_stocks / total_stocks if total_stocks > 0 else 0
+    # 计算完成率
+    completion_rate = updated_stocks / total_stocks if total_stocks > 0 else 0
 
-        # 判断是否成功（完成率 > 95%）
-        success_threshold = 0.95
-        is_successful = completion_rate >= success_threshold
+    # 判断是否成功（完成率 > 95%）
+    success_threshold = 0.95
+    is_successful = completion_rate >= success_threshold
 
-        result = {
-            "date": target_date,
-            "total_stocks": total_stocks,
-            "updated_stocks": updated_stocks,
-            "completion_rate": completion_rate,
-            "is_successful": is_successful,
-            "success_threshold": success_threshold,
-        }
+    result = {
+        "date": target_date,
+        "total_stocks": total_stocks,
+        "updated_stocks": updated_stocks,
+        "completion_rate": completion_rate,
+        "is_successful": is_successful,
+        "success_threshold": success_threshold,
+    }
 
-        return result
-
-    finally:
-        conn.close()
+    return result
 
 
 def main():
@@ -1,130 +1,146 @@
 #!/usr/bin/env python3
 """数据保存模块"""
 
+import functools
 import sqlite3
 from datetime import datetime
+from operator import itemgetter
 
+from .stock_database import StockDatabase
 
-def save_stock_info_data(db_path: str, table_name: str, data_list: list):
-    """保存股票信息数据到数据库"""
+# 各表共有的可选字段及默认值
+_COMMON_OPTIONAL = (("sentiment_score", None), ("is_valid", 1), ("llm_analysis", None))
+
+# 各表的 (必填字段, 可选字段及默认值)
+_TABLE_FIELDS = {
+    "stock_news": (
+        ("code", "title", "content", "source", "publish_date", "url", "fingerprint"),
+        _COMMON_OPTIONAL,
+    ),
+    "stock_announcements": (
+        ("code", "title", "content", "publish_date", "url", "fingerprint"),
+        (("announcement_type", None),) + _COMMON_OPTIONAL,
+    ),
+    "stock_comments": (
+        ("code", "content", "platform", "publish_date", "url", "fingerprint"),
+        (("author", None), ("likes", 0)) + _COMMON_OPTIONAL,
+    ),
+    "analyst_reports": (
+        ("code", "title", "publish_date", "url", "fingerprint"),
+        (
+            ("summary", None),
+            ("broker", None),
+            ("analyst", None),
+            ("rating", None),
+            ("target_price", None),
+        )
+        + _COMMON_OPTIONAL,
+    ),
+}
+
+
+def _build_table_spec(table_name: str, required: tuple, optional: tuple) -> tuple:
+    """生成插入语句以及必填/可选字段的取值函数"""
+    optional_fields = tuple(field for field, _ in optional)
+    optional_defaults = tuple(default for _, default in optional)
+    columns = required + optional_fields + ("created_at",)
+    sql = f"""
+        INSERT OR IGNORE INTO {table_name}
+        ({", ".join(columns)})
+        VALUES ({", ".join("?" * len(columns))})
+    """
+
+    def get_optional(item: dict) -> tuple:
+        return tuple(map(item.get, optional_fields, optional_defaults))
+
+    return sql, itemgetter(*required), get_optional, required.index("fingerprint")
+
+
+_TABLE_SPECS = {
+    table_name: _build_table_spec(table_name, required, optional)
+    for table_name, (required, optional) in _TABLE_FIELDS.items()
+}
+
+
+@functools.lru_cache(maxsize=8)
+def _get_db(db_path: str) -> StockDatabase:
+    """获取进程内复用的 StockDatabase
+
+    每个线程使用各自的连接，写入经由 transaction() 与其他写入者共享同一把写锁。
+    """
+    return StockDatabase(db_path)
+
+
+# 单条SQL中 IN (...) 的参数上限（低于SQLite默认的999）
+_MAX_SQL_PARAMS = 900
+
+
+def _existing_fingerprints(conn: sqlite3.Connection, table_name: str, fingerprints: list) -> set:
+    """批量查询表中已存在的指纹"""
+    existing = set()
+    for i in range(0, len(fingerprints), _MAX_SQL_PARAMS):
+        chunk = fingerprints[i : i + _MAX_SQL_PARAMS]
+        placeholders = ",".join("?" * len(chunk))
+        cursor = conn.execute(
+            f"SELECT fingerprint FROM {table_name} WHERE fingerprint IN ({placeholders})",
+            chunk,
+        )
+        existing.update(row[0] for row in cursor)
+    return existing
+
+
+def save_stock_info_data(db_path: str, table_name: str, data_list: list) -> set:
+    """保存股票信息数据到数据库，返回本次写入的记录指纹集合
+
+    缺少必要字段、已存在或保存失败的记录不在返回结果中。
+    """
     if not data_list:
-        return
+        return set()
 
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+    spec = _TABLE_SPECS.get(table_name)
+    if spec is None:
+        print(f"❌ 不支持的数据表: {table_name}")
+        return set()
+    sql, get_required, get_optional, fp_index = spec
+
+    # 确保必填字段存在，缺失的条目直接跳过
+    now_iso = datetime.now().isoformat()
+    rows = []
+    for item in data_list:
+        try:
+            required = get_required(item)
+        except KeyError:
+            continue
+        if None in required:
+            continue
+        rows.append(required + get_optional(item) + (now_iso,))
+
+    skipped = len(data_list) - len(rows)
+    if skipped:
+        print(f"警告: {skipped} 条记录缺少必要字段，已跳过")
+    if not rows:
+        return set()
+
+    db = _get_db(db_path)
 
     try:
-        for item in data_list:
-            # 确保必填字段存在
-            required_fields = [
-                "code",
-                "title",
-                "content",
-                "source",
-                "publish_date",
-                "url",
-                "fingerprint",
-            ]
-            for field in required_fields:
-                if field not in item or item[field] is None:
-                    print(f"警告: 缺少必要字段 {field}，跳过此条目")
-                    continue
-
-            # 插入数据
-            if table_name == "stock_news":
-                cursor.execute(
-                    """
-                    INSERT OR IGNORE INTO stock_news 
-                    (code, title, content, source, publish_date, url, fingerprint, created_at, sentiment_score, is_valid, llm_analysis)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-                    (
-                        item["code"],
-                        item["title"],
-                        item["content"],
-                        item["source"],
-                        item["publish_date"],
-                        item["url"],
-                        item["fingerprint"],
-                        datetime.now().isoformat(),
-                        item.get("sentiment_score"),
-                        item.get("is_valid", 1),
-                        item.get("llm_analysis"),
-                    ),
-                )
-            elif table_name == "stock_announcements":
-                cursor.execute(
-                    """
-                    INSERT OR IGNORE INTO stock_announcements 
-                    (code, title, content, announcement_type, publish_date, url, fingerprint, created_at, sentiment_score, is_valid, llm_analysis)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-                    (
-                        item["code"],
-                        item["title"],
-                        item["content"],
-                        item.get("announcement_type"),
-                        item["publish_date"],
-                        item["url"],
-                        item["fingerprint"],
-                        datetime.now().isoformat(),
-                        item.get("sentiment_score"),
-                        item.get("is_valid", 1),
-                        item.get("llm_analysis"),
-                    ),
-                )
-            elif table_name == "stock_comments":
-                cursor.execute(
-                    """
-                    INSERT OR IGNORE INTO stock_comments 
-                    (code, content, author, platform, publish_date, url, likes, fingerprint, created_at, sentiment_score, is_valid, llm_analysis)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-                    (
-                        item["code"],
-                        item["content"],
-                        item.get("author"),
-                        item["platform"],
-                        item["publish_date"],
-                        item["url"],
-                        item.get("likes", 0),
-                        item["fingerprint"],
-                        datetime.now().isoformat(),
-                        item.get("sentiment_score"),
-                        item.get("is_valid", 1),
-                        item.get("llm_analysis"),
-                    ),
-                )
-            elif table_name == "analyst_reports":
-                cursor.execute(
-                    """
-                    INSERT OR IGNORE INTO analyst_reports 
-                    (code, title, summary, broker, analyst, rating, target_price, publish_date, url, fingerprint, created_at, sentiment_score, is_valid, llm_analysis)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-                    (
-                        item["code"],
-                        item["title"],
-                        item.get("summary"),
-                        item.get("broker"),
-                        item.get("analyst"),
-                        item.get("rating"),
-                        item.get("target_price"),
-                        item["publish_date"],
-                        item["url"],
-                        item["fingerprint"],
-                        datetime.now().isoformat(),
-                        item.get("sentiment_score"),
-                        item.get("is_valid", 1),
-                        item.get("llm_analysis"),
-                    ),
-                )
-
-        conn.commit()
-        print(f"✅ 成功保存 {len(data_list)} 条记录到 {table_name}")
+        # 一次查询找出已入库的指纹，只插入新数据
+        existing = _existing_fingerprints(
+            db.get_connection(), table_name, [row[fp_index] for row in rows]
+        )
+        if existing:
+            rows = [row for row in rows if row[fp_index] not in existing]
+            print(f"⏭️  {len(data_list) - skipped - len(rows)} 条记录已存在，跳过")
+        if not rows:
+            return set()
+
+        # 单个事务内批量插入
+        with db.transaction() as conn:
+            conn.executemany(sql, rows)
+
+        print(f"✅ 成功保存 {len(rows)} 条记录到 {table_name}")
+        return {row[fp_index] for row in rows}
 
     except Exception as e:
         print(f"❌ 保存数据到 {table_name} 时出错: {e}")
-        conn.rollback()
-    finally:
-        conn.close()
+        return set()
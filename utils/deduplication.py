@@ -4,6 +4,9 @@
 import hashlib
 import sqlite3
 from datetime import datetime
+from typing import Dict, Optional, Set
+
+from .stock_database import StockDatabase
 
 
 # 安全的哈希函数，处理可能的缺失算法
@@ -17,11 +20,30 @@ def safe_md5(data: str) -> str:
         return str(hash(data))[:32]
 
 
+# 允许做去重检查的数据表（表名会拼入SQL，必须走白名单）
+ALLOWED_TABLES = frozenset(
+    {"stock_news", "stock_announcements", "stock_comments", "analyst_reports"}
+)
+
+
 class DeduplicationManager:
     """去重管理器"""
 
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, db: Optional[StockDatabase] = None):
         self.db_path = db_path
+        # 复用 StockDatabase 的线程内连接（已开启WAL），可由调用方共享传入
+        self.db = db if db is not None else StockDatabase(db_path)
+        # 每张表已存在的指纹/URL集合，首次检查时从数据库加载
+        self._fp_cache: Dict[str, Set[str]] = {}
+        self._url_cache: Dict[str, Set[str]] = {}
+        # 预先生成各表的存在性检查语句，便于连接复用已解析的语句
+        self._exists_sql = {
+            column: {
+                table: f"SELECT 1 FROM {table} WHERE {column} = ? LIMIT 1"
+                for table in ALLOWED_TABLES
+            }
+            for column in ("fingerprint", "url")
+        }
 
     def generate_content_fingerprint(
         self, title: str, content: str, source: str
@@ -35,28 +57,57 @@ class DeduplicationManager:
         """生成URL指纹"""
         return safe_md5(url)
 
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """当前线程的数据库连接"""
+        return self.db.get_connection()
+
+    @staticmethod
+    def _check_table(table_name: str):
+        """校验表名是否在白名单中"""
+        if table_name not in ALLOWED_TABLES:
+            raise ValueError(f"不支持去重检查的数据表: {table_name}")
+
+    def _load_column(self, table_name: str, column: str) -> Set[str]:
+        """一次性加载表中某列的全部取值"""
+        cursor = self.conn.cursor()
+        cursor.execute(f"SELECT {column} FROM {table_name} WHERE {column} IS NOT NULL")
+        return {row[0] for row in cursor.fetchall()}
+
+    def _exists(
+        self, cache: Dict[str, Set[str]], column: str, value: str, table_name: str
+    ) -> bool:
+        """先查内存集合，未命中时再查一次数据库（可能由其他进程写入）"""
+        self._check_table(table_name)
+        values = cache.get(table_name)
+        if values is None:
+            values = self._load_column(table_name, column)
+            cache[table_name] = values
+        if value in values:
+            return True
+
+        cursor = self.conn.cursor()
+        cursor.execute(self._exists_sql[column][table_name], (value,))
+        if cursor.fetchone() is None:
+            return False
+        values.add(value)
+        return True
+
     def is_content_exists(self, fingerprint: str, table_name: str) -> bool:
         """检查内容是否已存在"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        try:
-            cursor.execute(
-                f"SELECT id FROM {table_name} WHERE fingerprint = ?", (fingerprint,)
-            )
-            exists = cursor.fetchone() is not None
-            return exists
-        finally:
-            conn.close()
+        return self._exists(self._fp_cache, "fingerprint", fingerprint, table_name)
 
     def is_url_exists(self, url: str, table_name: str) -> bool:
         """检查URL是否已存在"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        try:
-            cursor.execute(f"SELECT id FROM {table_name} WHERE url = ?", (url,))
-            exists = cursor.fetchone() is not None
-            return exists
-        finally:
-            conn.close()
+        return self._exists(self._url_cache, "url", url, table_name)
+
+    def add(self, fingerprint: str, table_name: str, url: str = None):
+        """记录新入库的内容，保持缓存与数据库一致"""
+        if table_name in self._fp_cache:
+            self._fp_cache[table_name].add(fingerprint)
+        if url is not None and table_name in self._url_cache:
+            self._url_cache[table_name].add(url)
+
+    def close(self):
+        """关闭当前线程的数据库连接"""
+        self.db.close_connection()
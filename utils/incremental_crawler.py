@@ -2,113 +2,172 @@
 """增量爬虫管理器模块"""
 
 import sqlite3
+import time
 from datetime import datetime
+from typing import Dict, List, Optional, Set
+
 from .deduplication import DeduplicationManager
+from .stock_database import StockDatabase
 
 
 class IncrementalCrawler:
     """增量爬虫管理器"""
 
-    def __init__(self, db_path: str):
+    # 各类内容的爬取间隔（小时）
+    _TTL = {
+        "news": 2,  # 新闻每2小时爬取一次
+        "announcement": 6,  # 公告每6小时爬取一次
+        "comment": 1,  # 评论每1小时爬取一次
+        "report": 12,  # 报告每12小时爬取一次
+    }
+    _DEFAULT_TTL = 6  # 默认6小时
+
+    # 单条SQL中 IN (...) 的参数上限（低于SQLite默认的999）
+    _MAX_SQL_PARAMS = 900
+
+    def __init__(self, db_path: str, db: Optional[StockDatabase] = None):
         self.db_path = db_path
-        self.dedup_manager = DeduplicationManager(db_path)
+        # 与去重管理器共享同一个 StockDatabase 的线程内连接
+        self.db = db if db is not None else StockDatabase(db_path)
+        self.dedup_manager = DeduplicationManager(db_path, db=self.db)
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """当前线程的数据库连接"""
+        return self.db.get_connection()
+
+    @staticmethod
+    def _cutoff(now: float, hours: float) -> datetime:
+        """爬取截止时间，上次爬取早于该时间的需要重新爬取"""
+        return datetime.fromtimestamp(now - hours * 3600)
+
+    @staticmethod
+    def _is_due(last_crawl_time: Optional[str], cutoff: datetime) -> bool:
+        """判断上次爬取时间是否早于截止时间
+
+        last_crawl_time 可能是 isoformat() 的 'T' 分隔，也可能是空格分隔的
+        历史数据，统一解析后再比较；为空或无法解析时视为需要爬取。
+        """
+        if not last_crawl_time:
+            return True
+        try:
+            return datetime.fromisoformat(last_crawl_time) < cutoff
+        except (TypeError, ValueError):
+            return True
 
     def should_crawl_stock(self, stock_code: str, content_type: str) -> bool:
         """判断是否需要爬取某只股票的特定类型内容"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        try:
-            # 获取上次爬取时间
+        cursor = self.conn.cursor()
+
+        # 获取上次爬取时间
+        cursor.execute(
+            """
+            SELECT last_crawl_time FROM crawl_status
+            WHERE code = ? AND content_type = ?
+        """,
+            (stock_code, content_type),
+        )
+        result = cursor.fetchone()
+
+        # 从未爬取过，需要爬取
+        if result is None:
+            return True
+
+        # 根据内容类型的爬取频率比较截止时间
+        hours = self._TTL.get(content_type, self._DEFAULT_TTL)
+        return self._is_due(result[0], self._cutoff(time.time(), hours))
+
+    def get_crawl_plan(self) -> Dict[str, Dict[str, bool]]:
+        """一次查询 crawl_status，返回 {代码: {内容类型: 是否需要爬取}}
+
+        未出现在结果中的代码/内容类型表示从未爬取过，需要爬取。
+        """
+        now = time.time()
+        cutoffs = {
+            content_type: self._cutoff(now, hours)
+            for content_type, hours in self._TTL.items()
+        }
+        default_cutoff = self._cutoff(now, self._DEFAULT_TTL)
+
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT code, content_type, last_crawl_time FROM crawl_status")
+
+        plan: Dict[str, Dict[str, bool]] = {}
+        for code, content_type, last_crawl_time in cursor:
+            cutoff = cutoffs.get(content_type, default_cutoff)
+            plan.setdefault(code, {})[content_type] = self._is_due(
+                last_crawl_time, cutoff
+            )
+        return plan
+
+    def should_crawl_batch(self, stock_codes: List[str], content_type: str) -> Set[str]:
+        """批量判断需要爬取的股票，返回需要爬取特定类型内容的股票代码集合"""
+        if not stock_codes:
+            return set()
+
+        hours = self._TTL.get(content_type, self._DEFAULT_TTL)
+        cutoff = self._cutoff(time.time(), hours)
+        cursor = self.conn.cursor()
+        fresh = set()
+        for i in range(0, len(stock_codes), self._MAX_SQL_PARAMS):
+            chunk = stock_codes[i : i + self._MAX_SQL_PARAMS]
+            placeholders = ",".join("?" * len(chunk))
             cursor.execute(
-                """
-                SELECT last_crawl_time FROM crawl_status 
-                WHERE code = ? AND content_type = ?
+                f"""
+                SELECT code, last_crawl_time FROM crawl_status
+                WHERE content_type = ? AND code IN ({placeholders})
             """,
-                (stock_code, content_type),
+                [content_type, *chunk],
             )
-            result = cursor.fetchone()
-
-            if result is None:
-                # 从未爬取过，需要爬取
-                return True
-
-            last_crawl_time = result[0]
-            if last_crawl_time is None:
-                return True
-
-            # 计算时间间隔（小时）
-            last_crawl_dt = datetime.fromisoformat(last_crawl_time)
-            hours_since_crawl = (datetime.now() - last_crawl_dt).total_seconds() / 3600
-
-            # 根据内容类型设置爬取频率
-            if content_type == "news":
-                return hours_since_crawl > 2  # 新闻每2小时爬取一次
-            elif content_type == "announcement":
-                return hours_since_crawl > 6  # 公告每6小时爬取一次
-            elif content_type == "comment":
-                return hours_since_crawl > 1  # 评论每1小时爬取一次
-            elif content_type == "report":
-                return hours_since_crawl > 12  # 报告每12小时爬取一次
-            else:
-                return hours_since_crawl > 6  # 默认6小时
-
-        finally:
-            conn.close()
+            fresh.update(
+                code
+                for code, last_crawl_time in cursor
+                if not self._is_due(last_crawl_time, cutoff)
+            )
+
+        # 从未爬取、时间为空或超过爬取间隔的都需要爬取
+        return {code for code in stock_codes if code not in fresh}
 
     def get_default_score_for_stock(self, stock_code: str) -> float:
         """获取股票的默认评分（-1表示未处理）"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        try:
-            # 检查是否有近期的综合评分
-            cursor.execute(
-                """
-                SELECT overall_score FROM stock_sentiment_scores 
-                WHERE code = ? AND date >= date('now', '-30 days')
-                ORDER BY date DESC LIMIT 1
-                """,
-                (stock_code,),
-            )
-            result = cursor.fetchone()
-
-            if result and result[0] is not None:
-                return float(result[0])
-            else:
-                return -1.0  # 默认评分-1表示未处理
+        cursor = self.conn.cursor()
+
+        # 检查是否有近期的综合评分
+        cursor.execute(
+            """
+            SELECT overall_score FROM stock_sentiment_scores
+            WHERE code = ? AND date >= date('now', '-30 days')
+            ORDER BY date DESC LIMIT 1
+            """,
+            (stock_code,),
+        )
+        result = cursor.fetchone()
 
-        finally:
-            conn.close()
+        if result and result[0] is not None:
+            return float(result[0])
+        else:
+            return -1.0  # 默认评分-1表示未处理
 
     def update_crawl_status(
         self, stock_code: str, content_type: str, success_count: int = 0
     ):
         """更新爬取状态"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        try:
-            now = datetime.now().isoformat()
-            cursor.execute(
+        now = datetime.now().isoformat()
+        # 经由 StockDatabase 的事务（持有写锁），出错时回滚并抛出
+        with self.db.transaction() as conn:
+            conn.execute(
                 """
-                INSERT OR REPLACE INTO crawl_status 
+                INSERT INTO crawl_status
                 (code, content_type, last_crawl_time, total_count, status)
-                VALUES (?, ?, ?, 
-                    COALESCE((SELECT total_count FROM crawl_status WHERE code = ? AND content_type = ?), 0) + ?,
-                    'active'
-                )
+                VALUES (?, ?, ?, ?, 'active')
+                ON CONFLICT(code, content_type) DO UPDATE SET
+                    last_crawl_time = excluded.last_crawl_time,
+                    total_count = COALESCE(crawl_status.total_count, 0) + excluded.total_count,
+                    status = 'active'
             """,
-                (
-                    stock_code,
-                    content_type,
-                    now,
-                    stock_code,
-                    content_type,
-                    success_count,
-                ),
+                (stock_code, content_type, now, success_count),
             )
 
-            conn.commit()
-        finally:
-            conn.close()
+    def close(self):
+        """关闭当前线程的数据库连接"""
+        self.db.close_connection()
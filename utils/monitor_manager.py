@@ -1,39 +1,145 @@
 #!/usr/bin/env python3
 """监控和重启管理器"""
 
+import atexit
+import heapq
 import json
+import mmap
 import os
 import time
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any
 import sqlite3
 
+# 进度文件优先使用 orjson 序列化，未安装时退回标准库 json
+try:
+    import orjson
+
+    _json_dumps = orjson.dumps
+    _json_loads = orjson.loads
+except ImportError:
+
+    def _json_dumps(obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+    def _json_loads(data) -> Any:
+        # 标准库 json 不接受 memoryview
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+        return json.loads(data)
+
+# 超过该大小的进度文件通过 mmap 读取，避免额外复制一份文件内容
+_MMAP_LOAD_THRESHOLD = 1_000_000
+
 
 class MonitorManager:
     """监控和重启管理器，处理失败重试和中断恢复"""
 
+    # 追加日志中记录的统计计数
+    _LOG_COUNTERS = ("processed_stocks", "successful_stocks", "failed_stocks")
+
     def __init__(self, db_path: str, progress_file: str = "crawl_progress.json"):
         self.db_path = db_path
         self.progress_file = progress_file
+        # 每次状态变化追加一行到日志，定期压缩为完整快照（progress_file）
+        self.log_file = os.path.splitext(progress_file)[0] + ".log"
+        # (生成时间, ISO时间字符串)，1秒内的更新复用同一个时间字符串
+        self._ts_cache = (0.0, "")
+        # 自上次快照以来的更新次数（含重放的日志条数），每 _snapshot_every 次压缩一次
+        self._dirty = 0
+        self._snapshot_every = 500
         self.progress_data = self._load_progress()
+        self._log_fh = open(self.log_file, "ab")
+        atexit.register(self.flush)
+        # stock_list 中的全部股票代码，refresh_stock_list() 时重新加载
+        self._all_codes_cache = None
+        # (查询时间, {代码: 评分})，数据库评分缓存30秒
+        self._db_scores_cache = (0.0, {})
+        self._db_scores_ttl = 30.0
+        # 连接内的临时表 processed 是否已与 stocks_status 同步
+        self._processed_synced = False
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.executescript(
+            """
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            PRAGMA cache_size=-65536;
+            PRAGMA mmap_size=268435456;
+            PRAGMA temp_store=MEMORY;
+            """
+        )
+
+    def close(self):
+        """写入快照并关闭日志文件和数据库连接"""
+        self.flush()
+        self._log_fh.close()
+        self._conn.close()
+
+    def _now_iso(self) -> str:
+        """获取当前时间的ISO字符串（秒级以内复用缓存）"""
+        now = time.time()
+        cached_at, cached_iso = self._ts_cache
+        if now - cached_at < 1.0:
+            return cached_iso
+        now_iso = datetime.fromtimestamp(now).isoformat()
+        self._ts_cache = (now, now_iso)
+        return now_iso
 
     def _load_progress(self) -> Dict[str, Any]:
-        """加载进度数据"""
+        """加载进度数据：先读取快照，再重放追加日志"""
+        progress_data = None
         if os.path.exists(self.progress_file):
             try:
-                with open(self.progress_file, "r", encoding="utf-8") as f:
-                    return json.load(f)
+                progress_data = self._read_snapshot()
             except Exception as e:
                 print(f"⚠️  警告: 无法加载进度文件 {self.progress_file}: {e}")
-                return self._get_default_progress()
-        else:
-            return self._get_default_progress()
+        if progress_data is None:
+            progress_data = self._get_default_progress()
+
+        if os.path.exists(self.log_file):
+            self._replay_log(progress_data)
+        return progress_data
+
+    def _read_snapshot(self) -> Dict[str, Any]:
+        """读取进度快照，大文件通过只读 mmap 直接解析"""
+        with open(self.progress_file, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size <= _MMAP_LOAD_THRESHOLD:
+                return _json_loads(f.read())
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                with memoryview(mm) as view:
+                    return _json_loads(view)
+
+    def _replay_log(self, progress_data: Dict[str, Any]):
+        """将追加日志中的状态变化应用到快照数据上"""
+        with open(self.log_file, "rb") as f:
+            for line in f:
+                try:
+                    record = _json_loads(line)
+                except ValueError:
+                    # 中断时可能留下不完整的最后一行
+                    continue
+                progress_data["stocks_status"][record["code"]] = record["entry"]
+                progress_data.update(zip(self._LOG_COUNTERS, record["counts"]))
+                self._dirty += 1
+
+    def _append_log(self, stock_code: str):
+        """追加一条股票状态变化记录"""
+        record = {
+            "code": stock_code,
+            "entry": self.progress_data["stocks_status"][stock_code],
+            "counts": [self.progress_data[key] for key in self._LOG_COUNTERS],
+        }
+        self._log_fh.write(_json_dumps(record) + b"\n")
+        # 每条记录立即交给操作系统，进程被杀时不会丢失缓冲区中的更新；
+        # fsync 仍只在 flush()（含退出时）写快照时进行
+        self._log_fh.flush()
 
     def _get_default_progress(self) -> Dict[str, Any]:
         """获取默认进度数据"""
         return {
-            "start_time": datetime.now().isoformat(),
-            "last_update": datetime.now().isoformat(),
+            "start_time": self._now_iso(),
+            "last_update": self._now_iso(),
             "total_stocks": 0,
             "processed_stocks": 0,
             "successful_stocks": 0,
@@ -44,27 +150,54 @@ class MonitorManager:
             "max_retries": 3,
         }
 
-    def _save_progress(self):
-        """保存进度数据"""
+    def _save_progress(self, force: bool = False):
+        """记录一次进度更新，累计 _snapshot_every 次（或 force=True）时写入快照"""
+        self._dirty += 1
+        if not force and self._dirty < self._snapshot_every:
+            return
+        self._snapshot(fsync=force)
+
+    def _snapshot(self, fsync: bool = False):
+        """写入完整进度快照，并清空已被快照覆盖的追加日志
+
+        先写临时文件再 os.replace 原子替换，崩溃时最多丢失本次快照，
+        不会留下半个文件。定期快照不做 fsync，只在显式 flush 时落盘。
+        """
         try:
-            self.progress_data["last_update"] = datetime.now().isoformat()
-            with open(self.progress_file, "w", encoding="utf-8") as f:
-                json.dump(self.progress_data, f, indent=2, ensure_ascii=False)
+            self.progress_data["last_update"] = self._now_iso()
+            tmp_file = self.progress_file + ".tmp"
+            with open(tmp_file, "wb") as f:
+                f.write(_json_dumps(self.progress_data))
+                if fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(tmp_file, self.progress_file)
+
+            self._log_fh.flush()
+            os.truncate(self._log_fh.fileno(), 0)
+            self._dirty = 0
         except Exception as e:
             print(f"❌ 无法保存进度文件: {e}")
 
+    def flush(self):
+        """立即将进度数据写入快照"""
+        if self._dirty and not self._log_fh.closed:
+            self._save_progress(force=True)
+
     def get_all_stock_codes(self) -> List[str]:
-        """获取所有A股股票代码"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        try:
-            cursor.execute("SELECT code FROM stock_list ORDER BY code")
-            stock_codes = [row[0] for row in cursor.fetchall()]
-            self.progress_data["total_stocks"] = len(stock_codes)
-            self._save_progress()
-            return stock_codes
-        finally:
-            conn.close()
+        """获取所有A股股票代码（首次调用后缓存在实例上）"""
+        if self._all_codes_cache is None:
+            return self.refresh_stock_list()
+        return self._all_codes_cache
+
+    def refresh_stock_list(self) -> List[str]:
+        """重新从数据库加载股票代码列表并更新总数"""
+        cursor = self._conn.cursor()
+        cursor.execute("SELECT code FROM stock_list ORDER BY code")
+        self._all_codes_cache = [row[0] for row in cursor.fetchall()]
+        self.progress_data["total_stocks"] = len(self._all_codes_cache)
+        self._save_progress()
+        return self._all_codes_cache
 
     def should_process_stock(self, stock_code: str) -> bool:
         """判断是否需要处理某只股票"""
@@ -93,92 +226,159 @@ class MonitorManager:
 
         return False
 
-    def get_stocks_to_process(self, batch_size: int = 50) -> List[str]:
-        """获取需要处理的股票列表"""
-        all_stocks = self.get_all_stock_codes()
-        stocks_to_process = []
-
-        for stock_code in all_stocks:
-            if self.should_process_stock(stock_code):
-                stocks_to_process.append(stock_code)
-                if len(stocks_to_process) >= batch_size:
-                    break
+    @staticmethod
+    def _processed_row(stock_code: str, stock_status: Dict[str, Any]) -> tuple:
+        """将单只股票的进度转换为临时表行（最后尝试时间存为时间戳）"""
+        last_attempt = stock_status.get("last_attempt")
+        try:
+            last_ts = datetime.fromisoformat(last_attempt).timestamp()
+        except (TypeError, ValueError):
+            last_ts = None
+        return (
+            stock_code,
+            stock_status.get("status"),
+            stock_status.get("attempts", 0),
+            last_ts,
+        )
 
-        return stocks_to_process
+    def _sync_processed_table(self):
+        """将进度数据一次性写入临时表，之后由 mark_* 增量维护"""
+        if self._processed_synced:
+            return
+
+        self._conn.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS processed (
+                code TEXT PRIMARY KEY,
+                status TEXT,
+                attempts INTEGER,
+                last_attempt REAL
+            )
+        """)
+        self._conn.execute("DELETE FROM processed")
+        self._conn.executemany(
+            "INSERT INTO processed VALUES (?, ?, ?, ?)",
+            [
+                self._processed_row(stock_code, stock_status)
+                for stock_code, stock_status in self.progress_data[
+                    "stocks_status"
+                ].items()
+            ],
+        )
+        self._conn.commit()
+        self._processed_synced = True
+
+    def _update_processed(self, stock_code: str):
+        """同步单只股票的进度到临时表"""
+        if not self._processed_synced:
+            return
+        self._conn.execute(
+            "INSERT OR REPLACE INTO processed VALUES (?, ?, ?, ?)",
+            self._processed_row(
+                stock_code, self.progress_data["stocks_status"][stock_code]
+            ),
+        )
+        self._conn.commit()
+
+    def get_stocks_to_process(self, batch_size: int = 50) -> List[str]:
+        """获取需要处理的股票列表（筛选规则与 should_process_stock 一致）"""
+        self._sync_processed_table()
+        # 总数只在首次加载或 refresh_stock_list() 时更新并记录进度
+        self.get_all_stock_codes()
+        cursor = self._conn.cursor()
+
+        # 从未处理的需要处理；7天内成功过的跳过；其余未达最大重试次数的需要处理
+        recent_cutoff = (datetime.now() - timedelta(days=7)).timestamp()
+        cursor.execute(
+            """
+            SELECT s.code FROM stock_list s
+            LEFT JOIN processed p ON p.code = s.code
+            WHERE p.code IS NULL
+               OR (
+                   NOT (COALESCE(p.status, '') = 'success'
+                        AND COALESCE(p.last_attempt, 0) > ?)
+                   AND COALESCE(p.attempts, 0) < ?
+               )
+            ORDER BY s.code
+            LIMIT ?
+        """,
+            (recent_cutoff, self.progress_data["max_retries"], batch_size),
+        )
+        return [row[0] for row in cursor.fetchall()]
 
     def mark_stock_success(self, stock_code: str, score: float):
         """标记股票处理成功"""
-        if stock_code not in self.progress_data["stocks_status"]:
-            self.progress_data["stocks_status"][stock_code] = {}
-
-        self.progress_data["stocks_status"][stock_code].update(
+        entry = self.progress_data["stocks_status"].setdefault(stock_code, {})
+        entry.update(
             {
                 "status": "success",
                 "score": score,
-                "attempts": self.progress_data["stocks_status"][stock_code].get(
-                    "attempts", 0
-                )
-                + 1,
-                "last_attempt": datetime.now().isoformat(),
+                "attempts": entry.get("attempts", 0) + 1,
+                "last_attempt": self._now_iso(),
             }
         )
 
         self.progress_data["successful_stocks"] += 1
         self.progress_data["processed_stocks"] += 1
+        self._update_processed(stock_code)
+        self._append_log(stock_code)
         self._save_progress()
 
     def mark_stock_failed(self, stock_code: str, error: str = ""):
         """标记股票处理失败"""
-        if stock_code not in self.progress_data["stocks_status"]:
-            self.progress_data["stocks_status"][stock_code] = {}
-
-        current_attempts = self.progress_data["stocks_status"][stock_code].get(
-            "attempts", 0
-        )
-        self.progress_data["stocks_status"][stock_code].update(
+        entry = self.progress_data["stocks_status"].setdefault(stock_code, {})
+        attempts = entry.get("attempts", 0) + 1
+        entry.update(
             {
                 "status": "failed",
                 "error": error,
-                "attempts": current_attempts + 1,
-                "last_attempt": datetime.now().isoformat(),
+                "attempts": attempts,
+                "last_attempt": self._now_iso(),
             }
         )
 
         # 如果达到最大重试次数，计入失败统计
-        if current_attempts + 1 >= self.progress_data["max_retries"]:
+        if attempts >= self.progress_data["max_retries"]:
             self.progress_data["failed_stocks"] += 1
         self.progress_data["processed_stocks"] += 1
+        self._update_processed(stock_code)
+        self._append_log(stock_code)
         self._save_progress()
 
+    def _get_db_scores(self) -> Dict[str, Any]:
+        """获取数据库中近30天的综合评分（缓存 _db_scores_ttl 秒）"""
+        now = time.time()
+        cached_at, db_scores = self._db_scores_cache
+        if now - cached_at < self._db_scores_ttl:
+            return db_scores
+
+        cursor = self._conn.cursor()
+        cursor.execute("""
+            SELECT code, overall_score FROM stock_sentiment_scores 
+            WHERE date >= date('now', '-30 days')
+        """)
+        db_scores = dict(cursor.fetchall())
+        self._db_scores_cache = (now, db_scores)
+        return db_scores
+
     def get_existing_scores(self) -> Dict[str, float]:
         """获取现有的股票评分"""
-        scores = {}
-
-        # 从进度数据中获取已处理的股票评分
-        for stock_code, status in self.progress_data["stocks_status"].items():
-            if status.get("status") == "success":
-                scores[stock_code] = status.get("score", -1.0)
-            elif status.get("status") == "failed":
-                # 失败的股票给默认评分-1
-                scores[stock_code] = -1.0
-
-        # 从数据库中获取可能存在的评分
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        try:
-            cursor.execute("""
-                SELECT code, overall_score FROM stock_sentiment_scores 
-                WHERE date >= date('now', '-30 days')
-            """)
-            db_scores = dict(cursor.fetchall())
-
-            # 合并数据库中的评分（优先使用数据库中的评分）
-            for stock_code, score in db_scores.items():
-                if stock_code not in scores or scores[stock_code] == -1.0:
-                    scores[stock_code] = score if score is not None else -1.0
+        # 从进度数据中获取已处理的股票评分，失败的股票给默认评分-1
+        scores = {
+            stock_code: status.get("score", -1.0)
+            if status.get("status") == "success"
+            else -1.0
+            for stock_code, status in self.progress_data["stocks_status"].items()
+            if status.get("status") in ("success", "failed")
+        }
 
-        finally:
-            conn.close()
+        # 合并数据库中的评分（优先使用数据库中的评分）
+        scores.update(
+            {
+                stock_code: score if score is not None else -1.0
+                for stock_code, score in self._get_db_scores().items()
+                if scores.get(stock_code, -1.0) == -1.0
+            }
+        )
 
         return scores
 
@@ -191,8 +391,11 @@ class MonitorManager:
         # 过滤有效评分（排除-1的默认值）
         valid_scores = {k: v for k, v in scores.items() if v != -1.0}
 
-        # 按评分排序
-        sorted_stocks = sorted(valid_scores.items(), key=lambda x: x[1], reverse=True)
+        # 只取需要的前几名：评分达标的全部保留，其余补足到 top_n
+        qualified_count = sum(1 for v in valid_scores.values() if v >= min_score)
+        sorted_stocks = heapq.nlargest(
+            max(top_n, qualified_count), valid_scores.items(), key=lambda x: x[1]
+        )
 
         high_score_stocks = []
         nine_plus_count = 0
@@ -223,33 +426,39 @@ class MonitorManager:
         filename: str = "high_scoring_stocks_final.txt",
     ):
         """保存结果到文件"""
-        with open(filename, "w", encoding="utf-8") as f:
-            f.write("高评分股票列表\n")
-            f.write("=" * 50 + "\n")
-            f.write(f"生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-            f.write(f"数据来源: 最近3个月新闻、公告、评论、分析师报告\n")
-            f.write(f"总股票数: {self.progress_data['total_stocks']}\n")
-            f.write(f"已处理: {self.progress_data['processed_stocks']}\n")
-            f.write(f"成功: {self.progress_data['successful_stocks']}\n")
-            f.write(f"失败: {self.progress_data['failed_stocks']}\n")
-            f.write("\n")
-
-            nine_plus_count = sum(
-                1 for stock in high_scoring_stocks if stock["score"] >= 9.0
-            )
-            if nine_plus_count >= 100:
-                f.write(f"评分超过9分的股票 ({nine_plus_count}只):\n")
-            else:
-                f.write(f"评分前100名的股票 (评分≥9分的只有{nine_plus_count}只):\n")
-                f.write("注: 未处理的股票默认评分为-1\n")
+        lines = [
+            "高评分股票列表\n",
+            "=" * 50 + "\n",
+            f"生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n",
+            f"数据来源: 最近3个月新闻、公告、评论、分析师报告\n",
+            f"总股票数: {self.progress_data['total_stocks']}\n",
+            f"已处理: {self.progress_data['processed_stocks']}\n",
+            f"成功: {self.progress_data['successful_stocks']}\n",
+            f"失败: {self.progress_data['failed_stocks']}\n",
+            "\n",
+        ]
+
+        nine_plus_count = sum(
+            1 for stock in high_scoring_stocks if stock["score"] >= 9.0
+        )
+        if nine_plus_count >= 100:
+            lines.append(f"评分超过9分的股票 ({nine_plus_count}只):\n")
+        else:
+            lines.append(f"评分前100名的股票 (评分≥9分的只有{nine_plus_count}只):\n")
+            lines.append("注: 未处理的股票默认评分为-1\n")
 
-            f.write("-" * 50 + "\n")
+        lines.append("-" * 50 + "\n")
 
-            for i, stock in enumerate(high_scoring_stocks, 1):
-                if stock["score"] == -1.0:
-                    f.write(f"{i:3d}. {stock['code']} - 默认评分(-1)/10\n")
-                else:
-                    f.write(f"{i:3d}. {stock['code']} - {stock['score']:.2f}/10\n")
+        lines.extend(
+            f"{i:3d}. {stock['code']} - 默认评分(-1)/10\n"
+            if stock["score"] == -1.0
+            else f"{i:3d}. {stock['code']} - {stock['score']:.2f}/10\n"
+            for i, stock in enumerate(high_scoring_stocks, 1)
+        )
+
+        # 一次性写入全部内容
+        with open(filename, "w", encoding="utf-8") as f:
+            f.writelines(lines)
 
         print(f"📄 结果已保存到 {filename}")
         return filename
@@ -9,6 +9,33 @@ import numpy as np
 from typing import Dict, List, Optional
 
 
+# calculate_all_indicators 一次性计算的全部指标
+# pandas_ta 0.4 将 Strategy 更名为 Study，这里兼容两种版本
+_ALL_INDICATORS_STUDY = getattr(ta, "Study", None) or ta.Strategy
+_ALL_INDICATORS_STUDY = _ALL_INDICATORS_STUDY(
+    name="all_indicators",
+    ta=[{"kind": "sma", "length": p} for p in (5, 10, 20, 50, 200)]
+    + [{"kind": "ema", "length": p} for p in (5, 10, 20, 50, 200)]
+    + [{"kind": "rsi", "length": p} for p in (6, 14, 21)]
+    + [
+        {"kind": "macd", "fast": 12, "slow": 26, "signal": 9},
+        {"kind": "bbands", "length": 20, "std": 2},
+        {"kind": "atr", "length": 14},
+        {"kind": "adx", "length": 14},
+        {"kind": "cci", "length": 20},
+    ],
+)
+
+# 布林带列名前缀到统一列名的映射
+_BB_COLUMN_PREFIXES = {
+    "BBU": "bb_upper",
+    "BBM": "bb_middle",
+    "BBL": "bb_lower",
+    "BBP": "bb_percent",
+    "BBB": "bb_width",
+}
+
+
 class StockAnalyzer:
     """股票数据分析器"""
 
@@ -38,133 +65,172 @@ class StockAnalyzer:
         # 按日期排序
         self.df = self.df.sort_values("date").reset_index(drop=True)
 
+    def _result_frame(self, inplace_on: Optional[pd.DataFrame]) -> pd.DataFrame:
+        """返回用于写入指标的 DataFrame（未指定时复制一份 self.df）"""
+        return self.df.copy() if inplace_on is None else inplace_on
+
+    @staticmethod
+    def _assign_columns(
+        df_result: pd.DataFrame,
+        indicator_df: Optional[pd.DataFrame],
+        columns: Optional[List[str]] = None,
+    ) -> pd.DataFrame:
+        """将多列指标结果按列写入 df_result（数据不足时 pandas_ta 返回 None，不添加列）"""
+        if indicator_df is not None:
+            # 行索引一致，直接按列赋值，避免 concat 复制已有列
+            for col in indicator_df.columns if columns is None else columns:
+                if col in indicator_df.columns:
+                    df_result[col] = indicator_df[col].values
+        return df_result
+
+    # 以下私有方法只返回新指标本身，不复制整个 DataFrame
+
+    def _sma(self, period: int) -> pd.Series:
+        return ta.sma(self.df["close"], length=period)
+
+    def _ema(self, period: int) -> pd.Series:
+        return ta.ema(self.df["close"], length=period)
+
+    def _rsi(self, period: int) -> pd.Series:
+        return ta.rsi(self.df["close"], length=period)
+
+    def _macd(self, fast: int, slow: int, signal: int) -> Optional[pd.DataFrame]:
+        return ta.macd(self.df["close"], fast=fast, slow=slow, signal=signal)
+
+    def _bbands(self, length: int, std: int) -> Optional[pd.DataFrame]:
+        bb_df = ta.bbands(self.df["close"], length=length, std=std)
+        # 重命名列以避免冲突
+        if bb_df is not None:
+            bb_df = bb_df.rename(columns=self._bb_column_name)
+        return bb_df
+
+    def _atr(self, length: int) -> pd.Series:
+        return ta.atr(self.df["high"], self.df["low"], self.df["close"], length=length)
+
+    def _adx(self, length: int) -> Optional[pd.DataFrame]:
+        return ta.adx(self.df["high"], self.df["low"], self.df["close"], length=length)
+
+    def _cci(self, length: int) -> pd.Series:
+        return ta.cci(self.df["high"], self.df["low"], self.df["close"], length=length)
+
+    @staticmethod
+    def _bb_column_name(col: str) -> str:
+        """布林带原始列名到统一列名的映射
+
+        参数后缀随 pandas_ta 版本不同（BBU_20_2.0 / BBU_20_2.0_2.0），只按前缀匹配。
+        """
+        return _BB_COLUMN_PREFIXES.get(col.split("_", 1)[0], col)
+
     def calculate_moving_averages(
-        self, periods: List[int] = [5, 10, 20, 50, 200]
+        self,
+        periods: List[int] = [5, 10, 20, 50, 200],
+        inplace_on: Optional[pd.DataFrame] = None,
     ) -> pd.DataFrame:
         """计算移动平均线"""
-        df_result = self.df.copy()
+        df_result = self._result_frame(inplace_on)
         for period in periods:
-            df_result[f"sma_{period}"] = ta.sma(df_result["close"], length=period)
-            df_result[f"ema_{period}"] = ta.ema(df_result["close"], length=period)
+            df_result[f"sma_{period}"] = self._sma(period)
+            df_result[f"ema_{period}"] = self._ema(period)
         return df_result
 
-    def calculate_rsi(self, periods: List[int] = [6, 14, 21]) -> pd.DataFrame:
+    def calculate_rsi(
+        self,
+        periods: List[int] = [6, 14, 21],
+        inplace_on: Optional[pd.DataFrame] = None,
+    ) -> pd.DataFrame:
         """计算 RSI (相对强弱指数)"""
-        df_result = self.df.copy()
+        df_result = self._result_frame(inplace_on)
         for period in periods:
-            df_result[f"rsi_{period}"] = ta.rsi(df_result["close"], length=period)
+            df_result[f"rsi_{period}"] = self._rsi(period)
         return df_result
 
     def calculate_macd(
-        self, fast: int = 12, slow: int = 26, signal: int = 9
+        self,
+        fast: int = 12,
+        slow: int = 26,
+        signal: int = 9,
+        inplace_on: Optional[pd.DataFrame] = None,
     ) -> pd.DataFrame:
         """计算 MACD (移动平均收敛/发散)"""
-        df_result = self.df.copy()
-        macd_df = ta.macd(df_result["close"], fast=fast, slow=slow, signal=signal)
-        df_result = pd.concat([df_result, macd_df], axis=1)
-        return df_result
-
-    def calculate_bollinger_bands(self, length: int = 20, std: int = 2) -> pd.DataFrame:
+        df_result = self._result_frame(inplace_on)
+        return self._assign_columns(df_result, self._macd(fast, slow, signal))
+
+    def calculate_bollinger_bands(
+        self,
+        length: int = 20,
+        std: int = 2,
+        inplace_on: Optional[pd.DataFrame] = None,
+    ) -> pd.DataFrame:
         """计算布林带"""
-        df_result = self.df.copy()
-        bb_df = ta.bbands(df_result["close"], length=length, std=std)
-        # 重命名列以避免冲突
-        bb_df = bb_df.rename(
-            columns={
-                f"BBU_{length}_{std}": "bb_upper",
-                f"BBM_{length}_{std}": "bb_middle",
-                f"BBL_{length}_{std}": "bb_lower",
-                f"BBP_{length}_{std}": "bb_percent",
-                f"BBW_{length}_{std}": "bb_width",
-            }
-        )
-        df_result = pd.concat([df_result, bb_df], axis=1)
-        return df_result
+        df_result = self._result_frame(inplace_on)
+        return self._assign_columns(df_result, self._bbands(length, std))
 
-    def calculate_atr(self, length: int = 14) -> pd.DataFrame:
+    def calculate_atr(
+        self, length: int = 14, inplace_on: Optional[pd.DataFrame] = None
+    ) -> pd.DataFrame:
         """计算 ATR (平均真实波幅)"""
-        df_result = self.df.copy()
-        df_result["atr"] = ta.atr(
-            df_result["high"], df_result["low"], df_result["close"], length=length
-        )
+        df_result = self._result_frame(inplace_on)
+        df_result["atr"] = self._atr(length)
         return df_result
 
-    def calculate_adx(self, length: int = 14) -> pd.DataFrame:
+    def calculate_adx(
+        self, length: int = 14, inplace_on: Optional[pd.DataFrame] = None
+    ) -> pd.DataFrame:
         """计算 ADX (平均方向指数)"""
-        df_result = self.df.copy()
-        adx_df = ta.adx(
-            df_result["high"], df_result["low"], df_result["close"], length=length
-        )
-        df_result = pd.concat([df_result, adx_df], axis=1)
-        return df_result
+        df_result = self._result_frame(inplace_on)
+        return self._assign_columns(df_result, self._adx(length))
 
-    def calculate_cci(self, length: int = 20) -> pd.DataFrame:
+    def calculate_cci(
+        self, length: int = 20, inplace_on: Optional[pd.DataFrame] = None
+    ) -> pd.DataFrame:
         """计算 CCI (商品通道指数)"""
-        df_result = self.df.copy()
-        df_result["cci"] = ta.cci(
-            df_result["high"], df_result["low"], df_result["close"], length=length
-        )
+        df_result = self._result_frame(inplace_on)
+        df_result["cci"] = self._cci(length)
         return df_result
 
-    def calculate_all_indicators(self) -> pd.DataFrame:
-        """计算所有常用技术指标"""
-        df_result = self.df.copy()
-
-        # 移动平均线
-        df_ma = self.calculate_moving_averages([5, 10, 20, 50, 200])
-        ma_columns = [
-            "sma_5",
-            "sma_10",
-            "sma_20",
-            "sma_50",
-            "sma_200",
-            "ema_5",
-            "ema_10",
-            "ema_20",
-            "ema_50",
-            "ema_200",
-        ]
-        for col in ma_columns:
-            if col in df_ma.columns:
-                df_result[col] = df_ma[col]
-
-        # RSI
-        df_rsi = self.calculate_rsi([6, 14, 21])
-        rsi_columns = ["rsi_6", "rsi_14", "rsi_21"]
-        for col in rsi_columns:
-            if col in df_rsi.columns:
-                df_result[col] = df_rsi[col]
-
-        # MACD
-        df_macd = self.calculate_macd()
-        for col in df_macd.columns:
-            if col.startswith("MACD"):
-                df_result[col] = df_macd[col]
-
-        # 布林带
-        df_bb = self.calculate_bollinger_bands()
-        bb_columns = ["bb_upper", "bb_middle", "bb_lower", "bb_percent", "bb_width"]
-        for col in bb_columns:
-            if col in df_bb.columns:
-                df_result[col] = df_bb[col]
-
-        # ATR
-        df_atr = self.calculate_atr()
-        if "atr" in df_atr.columns:
-            df_result["atr"] = df_atr["atr"]
-
-        # ADX
-        df_adx = self.calculate_adx()
-        for col in df_adx.columns:
-            if col.startswith("ADX"):
-                df_result[col] = df_adx[col]
-
-        # CCI
-        df_cci = self.calculate_cci()
-        if "cci" in df_cci.columns:
-            df_result["cci"] = df_cci["cci"]
+    @classmethod
+    def _study_column_name(cls, col: str) -> Optional[str]:
+        """将 pandas_ta 批量计算输出的列名转换为统一列名，不需要的列返回 None"""
+        if col.startswith(("MACD", "ADX")):
+            return col
+        kind, _, rest = col.partition("_")
+        if kind in ("SMA", "EMA", "RSI") and rest.isdigit():
+            return f"{kind.lower()}_{rest}"
+        if kind in _BB_COLUMN_PREFIXES:
+            return cls._bb_column_name(col)
+        # ATR 列名随版本不同（ATRr_14 / ATR_14），CCI 带常数后缀
+        if kind.startswith("ATR"):
+            return "atr"
+        if kind == "CCI":
+            return "cci"
+        return None
+
+    def calculate_all_indicators(self, cores: int = 0) -> pd.DataFrame:
+        """
+        计算所有常用技术指标
 
-        return df_result
+        Args:
+            cores: pandas_ta 批量计算使用的进程数。单只股票只有几百行，
+                进程池的启动开销远大于计算本身，默认 0 即顺序执行
+        """
+        # 只复制一次，所有指标通过一次批量调用写入同一个 DataFrame
+        df_result = self.df.copy()
+        source_columns = set(df_result.columns)
+        run = getattr(df_result.ta, "study", None) or df_result.ta.strategy
+        run(_ALL_INDICATORS_STUDY, cores=cores, verbose=False)
+
+        # 统一列名，并去掉不需要的附加列（如 ADX 的 DMP/DMN）
+        rename_map = {}
+        drop_columns = []
+        for col in df_result.columns:
+            if col in source_columns:
+                continue
+            name = self._study_column_name(col)
+            if name is None:
+                drop_columns.append(col)
+            elif name != col:
+                rename_map[col] = name
+        return df_result.drop(columns=drop_columns).rename(columns=rename_map)
 
     def get_technical_signals(self) -> Dict[str, str]:
         """获取技术信号摘要"""
@@ -234,18 +300,19 @@ def create_stock_dataframe_from_db(
     import sqlite3
 
     conn = sqlite3.connect(db_path)
+    # 子查询取最近 limit 条，外层直接按日期从旧到新排序
     query = """
-    SELECT date, open, high, low, close, volume, ma5, ma10, ma20, rsi6, rsi14, pct_change
-    FROM merged_stocks
-    WHERE code = ?
-    ORDER BY date DESC
-    LIMIT ?
+    SELECT * FROM (
+        SELECT date, open, high, low, close, volume, ma5, ma10, ma20, rsi6, rsi14, pct_change
+        FROM merged_stocks
+        WHERE code = ?
+        ORDER BY date DESC
+        LIMIT ?
+    )
+    ORDER BY date ASC
     """
     df = pd.read_sql_query(query, conn, params=[stock_code, limit])
     conn.close()
-
-    # 反转顺序，使日期从旧到新
-    df = df.iloc[::-1].reset_index(drop=True)
     return df
 
 
@@ -262,33 +329,25 @@ def merge_technical_indicators_to_db(
     """
     import sqlite3
 
-    conn = sqlite3.connect(db_path)
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
 
     # 获取现有的列名
     cursor = conn.cursor()
+    # UPDATE 按 (code, date) 定位行，确保以其为前缀的索引存在（与 StockDatabase 一致）
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_merged_ohlcv "
+        "ON merged_stocks (code, date, open, high, low, close, volume)"
+    )
     cursor.execute("PRAGMA table_info(merged_stocks)")
     existing_columns = [row[1] for row in cursor.fetchall()]
 
-    # 准备要更新的数据
-    update_data = []
-    new_columns = []
-
-    for _, row in df_with_indicators.iterrows():
-        record = {"code": stock_code, "date": row["date"]}
-
-        # 添加现有列的数据
-        for col in existing_columns:
-            if col in row and col not in ["code", "date"]:
-                record[col] = row[col]
-
-        # 添加新指标列
-        for col in df_with_indicators.columns:
-            if col not in existing_columns and col not in ["code", "date"]:
-                if col not in new_columns:
-                    new_columns.append(col)
-                record[col] = row[col]
-
-        update_data.append(record)
+    # 要更新的列在所有行中相同，只需确定一次
+    update_columns = [
+        col for col in df_with_indicators.columns if col not in ["code", "date"]
+    ]
+    new_columns = [col for col in update_columns if col not in existing_columns]
 
     # 添加新列到表中（如果不存在）
     for col in new_columns:
@@ -298,24 +357,31 @@ def merge_technical_indicators_to_db(
             # 列已存在
             pass
 
-    # 更新数据
-    for record in update_data:
-        set_clause = ", ".join(
-            [f"{k} = ?" for k in record.keys() if k not in ["code", "date"]]
-        )
-        values = [record[k] for k in record.keys() if k not in ["code", "date"]]
-        values.extend([record["code"], record["date"]])
-
-        cursor.execute(
-            f"""
-        UPDATE merged_stocks 
-        SET {set_clause}
-        WHERE code = ? AND date = ?
-        """,
-            values,
-        )
-
-    conn.commit()
+    if not update_columns:
+        conn.close()
+        return
+
+    # 单条预编译语句 + executemany 批量更新
+    set_clause = ", ".join(f"{col} = ?" for col in update_columns)
+    sql = f"""
+    UPDATE merged_stocks 
+    SET {set_clause}
+    WHERE code = ? AND date = ?
+    """
+    rows = (
+        df_with_indicators[update_columns]
+        .astype(object)
+        .itertuples(index=False, name=None)
+    )
+    params = (
+        values + (stock_code, date)
+        for values, date in zip(rows, df_with_indicators["date"])
+    )
+
+    # 显式事务，全部更新只提交一次
+    with conn:
+        conn.execute("BEGIN")
+        conn.executemany(sql, params)
     conn.close()
 
 
@@ -3,6 +3,30 @@
 
 from typing import Optional
 
+import numpy as np
+
+# 新闻、公告、评论、报告的权重
+_WEIGHTS = (0.3, 0.25, 0.2, 0.25)
+
+# 按4位掩码（新闻为最高位）预先计算的16种评分组合的权重和及归一化权重
+_PARTIAL_WEIGHT_SUMS = tuple(
+    sum(w for i, w in enumerate(_WEIGHTS) if mask >> (3 - i) & 1)
+    for mask in range(16)
+)
+_NORMALIZED_WEIGHTS = tuple(
+    tuple(
+        w / _PARTIAL_WEIGHT_SUMS[mask] if mask >> (3 - i) & 1 else 0.0
+        for i, w in enumerate(_WEIGHTS)
+    )
+    if mask
+    else None
+    for mask in range(16)
+)
+# 批量计算用的归一化权重矩阵（全部缺失的一行为0）
+_NORMALIZED_WEIGHT_MATRIX = np.array(
+    [weights or (0.0,) * 4 for weights in _NORMALIZED_WEIGHTS]
+)
+
 
 def calculate_overall_sentiment_score(
     news_score: Optional[float] = None,
@@ -11,34 +35,60 @@ def calculate_overall_sentiment_score(
     report_score: Optional[float] = None,
 ) -> float:
     """计算综合情感评分"""
-    scores = []
-    weights = []
+    # 非数值的评分视为缺失
+    news = news_score if isinstance(news_score, (int, float)) else None
+    announcement = (
+        announcement_score if isinstance(announcement_score, (int, float)) else None
+    )
+    comment = comment_score if isinstance(comment_score, (int, float)) else None
+    report = report_score if isinstance(report_score, (int, float)) else None
 
-    if news_score is not None and isinstance(news_score, (int, float)):
-        scores.append(float(news_score))
-        weights.append(0.3)  # 新闻权重30%
+    mask = (
+        (news is not None) << 3
+        | (announcement is not None) << 2
+        | (comment is not None) << 1
+        | (report is not None)
+    )
+    if not mask:
+        return 5.0  # 默认中性分数
 
-    if announcement_score is not None and isinstance(announcement_score, (int, float)):
-        scores.append(float(announcement_score))
-        weights.append(0.25)  # 公告权重25%
+    # 加权平均（查表取得按存在的评分归一化后的权重）
+    w_news, w_announcement, w_comment, w_report = _NORMALIZED_WEIGHTS[mask]
+    overall_score = (
+        (news or 0.0) * w_news
+        + (announcement or 0.0) * w_announcement
+        + (comment or 0.0) * w_comment
+        + (report or 0.0) * w_report
+    )
+    return round(overall_score, 2)
 
-    if comment_score is not None and isinstance(comment_score, (int, float)):
-        scores.append(float(comment_score))
-        weights.append(0.2)  # 评论权重20%
 
-    if report_score is not None and isinstance(report_score, (int, float)):
-        scores.append(float(report_score))
-        weights.append(0.25)  # 报告权重25%
+def calculate_overall_sentiment_scores_batch(
+    news_scores: np.ndarray,
+    announcement_scores: np.ndarray,
+    comment_scores: np.ndarray,
+    report_scores: np.ndarray,
+) -> np.ndarray:
+    """批量计算综合情感评分
 
-    if not scores:
-        return 5.0  # 默认中性分数
+    四个参数为长度相同的一维数组，缺失的评分用 NaN 表示。
+    结果与逐只调用 calculate_overall_sentiment_score 一致，全部缺失时为 5.0。
+    """
+    stack = np.column_stack(
+        [news_scores, announcement_scores, comment_scores, report_scores]
+    ).astype(np.float64)
+    present = ~np.isnan(stack)
 
-    # 归一化权重
-    total_weight = sum(weights)
-    normalized_weights = [w / total_weight for w in weights]
+    # 按存在的评分组合查表取得归一化权重（与逐只计算使用同一张表）
+    mask = present @ np.array([8, 4, 2, 1])
+    weights = _NORMALIZED_WEIGHT_MATRIX[mask]
+    values = np.where(present, stack, 0.0)
 
-    # 加权平均
-    overall_score = sum(
-        score * weight for score, weight in zip(scores, normalized_weights)
-    )
-    return round(overall_score, 2)
+    # 按与逐只计算相同的顺序逐项累加，保证浮点结果一致
+    overall_scores = values[:, 0] * weights[:, 0]
+    for i in range(1, 4):
+        overall_scores = overall_scores + values[:, i] * weights[:, i]
+    overall_scores[mask == 0] = 5.0  # 默认中性分数
+
+    # np.round 先乘100再取整，在 x.xx5 边界上可能与内置 round 相差 0.01
+    return np.round(overall_scores, 2)
@@ -1,44 +1,222 @@
 #!/usr/bin/env python3
 """股票数据库操作工具类 - 支持增删改查"""
 
+import os
 import sqlite3
 import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, List, Optional, Any, Tuple
+from typing import Dict, Iterator, List, Optional, Any, Tuple
 from contextlib import contextmanager
+from functools import lru_cache
+
+# merged_stocks 中除 code/date 外按顺序插入的字段
+_MERGED_OPTIONAL_FIELDS = (
+    "open", "high", "low", "close", "volume", "amount",
+    "outstanding_share", "turnover", "name",
+    "ma5", "ma10", "ma20", "rsi6", "rsi14", "pct_change",
+)
+
+# update_stock_data 允许更新的字段
+UPDATE_FIELDS = frozenset(_MERGED_OPTIONAL_FIELDS)
+# 查询时允许指定的列
+_SELECTABLE_COLUMNS = frozenset(("id", "created_at", "code", "date") + _MERGED_OPTIONAL_FIELDS)
+
+
+def _iter_dicts(cursor: sqlite3.Cursor) -> Iterator[Dict]:
+    """逐行将查询结果转换为字典，不先 fetchall 整个结果集"""
+    columns = [desc[0] for desc in cursor.description]
+    for row in cursor:
+        yield dict(zip(columns, row))
+
+
+def _select_list(columns: Optional[List[str]], alias: str = "") -> str:
+    """生成 SELECT 列清单，未指定列时返回全部列"""
+    if not columns:
+        return f"{alias}*"
+    unknown = [col for col in columns if col not in _SELECTABLE_COLUMNS]
+    if unknown:
+        raise ValueError(f"未知的列: {unknown}")
+    return ", ".join(f"{alias}{col}" for col in columns)
+
+
+@lru_cache(maxsize=64)
+def _build_update_sql(fields: Tuple[str, ...]) -> str:
+    """按更新字段组合生成 UPDATE 语句（常见组合会被缓存）"""
+    return f"""
+        UPDATE merged_stocks 
+        SET {', '.join(f"{field} = ?" for field in fields)}
+        WHERE code = ? AND date = ?
+    """
+
+# 导出到 Parquet 的技术指标列
+_INDICATOR_COLUMNS = ("ma5", "ma10", "ma20", "rsi6", "rsi14")
+
+
+def _indicator_schema(pa):
+    """Parquet 指标数据集的 schema（code 作为分区列，保持字符串以保留前导零）"""
+    return pa.schema(
+        [("code", pa.string()), ("date", pa.string())]
+        + [(col, pa.float64()) for col in _INDICATOR_COLUMNS]
+    )
+
+
+# 每个新连接执行的PRAGMA（均为连接级设置）
+_CONNECTION_PRAGMAS = """
+    PRAGMA synchronous=NORMAL;
+    PRAGMA temp_store=MEMORY;
+    PRAGMA cache_size=-65536;
+    PRAGMA mmap_size=268435456;
+    PRAGMA busy_timeout=5000;
+"""
+
+
+# 热点SQL使用固定的字符串常量，命中连接的预编译语句缓存
+_SQL_INSERT_MERGED = """
+    INSERT INTO merged_stocks 
+    (id, created_at, code, date, open, high, low, close, volume, amount, 
+     outstanding_share, turnover, name, ma5, ma10, ma20, rsi6, rsi14, pct_change)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+_SQL_EXISTS = "SELECT 1 FROM merged_stocks WHERE code = ? AND date = ? LIMIT 1"
+# 超过该数量的代码列表改用临时表关联查询
+_MAX_IN_CODES = 500
+
+# init_database 中建立/清理的索引（名称与 DATABASE_SCHEMA.md 一致）
+_INDEX_SQLS = (
+    "CREATE INDEX IF NOT EXISTS idx_news_fingerprint ON stock_news (fingerprint)",
+    # 与 select_stock_data 的 ORDER BY date DESC, code 一致，带 LIMIT 时无需排序；
+    # 同时覆盖按日期的查询，取代原有的 idx_merged_stocks_date
+    "CREATE INDEX IF NOT EXISTS idx_merged_date_code ON merged_stocks (date DESC, code)",
+    "DROP INDEX IF EXISTS idx_merged_stocks_date",
+    # 覆盖索引：get_stock_data 的 OHLCV 查询无需回表，
+    # 同时以 (code, date) 为前缀，取代原有的 idx_merged_stocks_code_date
+    "CREATE INDEX IF NOT EXISTS idx_merged_ohlcv ON merged_stocks (code, date, open, high, low, close, volume)",
+    "DROP INDEX IF EXISTS idx_merged_stocks_code_date",
+)
+_SQL_GET_OHLCV = """
+    SELECT open, high, low, close, volume
+    FROM merged_stocks
+    WHERE code = ? AND date = ?
+    LIMIT 1
+"""
+
+
+def _compile_row_builder(fields: Tuple[str, ...]):
+    """生成按固定字段顺序构造插入参数的函数
+
+    字段顺序固定，直接生成逐字段展开的函数体，避免每行都遍历字段列表。
+    生成的函数等价于:
+        def build(data, now_str):
+            get = data.get
+            return (None, now_str, data["code"], data["date"], get("open"), ...)
+    """
+    values = ", ".join(f"get({field!r})" for field in fields)
+    source = (
+        "def build(data, now_str):\n"
+        "    get = data.get\n"
+        f"    return (None, now_str, data['code'], data['date'], {values})\n"
+    )
+    namespace: Dict[str, Any] = {}
+    exec(compile(source, "<merged_row_builder>", "exec"), namespace)
+    return namespace["build"]
+
+
+# 构造 merged_stocks 插入参数 (id, created_at, code, date, ...)
+_build_merged_row = _compile_row_builder(_MERGED_OPTIONAL_FIELDS)
 
 
 class StockDatabase:
     """股票数据库操作类 - 线程安全的增删改查"""
     
+    # 本进程内已切换到WAL模式的数据库路径
+    _journal_set: set = set()
+    # 按数据库文件共享的写锁：同一文件的所有实例在进程内串行写入
+    _write_locks: Dict[str, threading.RLock] = {}
+    _write_locks_guard = threading.Lock()
+    
     def __init__(self, db_path: str):
         self.db_path = db_path
         self.local = threading.local()
+        # SQLite 同时只允许一个写入者，写事务在进程内串行执行，读操作不加锁
+        self._write_lock = self._get_write_lock(db_path)
+        # 专用写线程，异步写入按提交顺序串行执行（首次使用时创建）
+        self._writer: Optional[ThreadPoolExecutor] = None
+        # 只保护写线程的创建与关闭，不能用写锁：写锁可能被正在执行的写事务长时间持有
+        self._writer_init_lock = threading.Lock()
+    
+    @classmethod
+    def _get_write_lock(cls, db_path: str) -> threading.RLock:
+        """获取数据库文件对应的进程级写锁"""
+        key = os.path.abspath(db_path)
+        with cls._write_locks_guard:
+            lock = cls._write_locks.get(key)
+            if lock is None:
+                lock = cls._write_locks[key] = threading.RLock()
+            return lock
     
     def get_connection(self) -> sqlite3.Connection:
         """获取当前线程的数据库连接"""
         if not hasattr(self.local, 'conn') or self.local.conn is None:
-            self.local.conn = sqlite3.connect(self.db_path)
-            self.local.conn.execute("PRAGMA journal_mode=WAL")
-            self.local.conn.execute("PRAGMA synchronous=NORMAL")
+            conn = sqlite3.connect(self.db_path, cached_statements=256)
+            # 连接级PRAGMA合并为一次执行；mmap_size 为 256MB 内存映射读
+            conn.executescript(_CONNECTION_PRAGMAS)
+            # journal_mode 持久化在数据库文件中，进程内每个库只需设置一次
+            if self.db_path not in StockDatabase._journal_set:
+                # page_size 只对尚未建表的新库生效（且须在切换到WAL之前设置）
+                if conn.execute("PRAGMA page_count").fetchone()[0] == 0:
+                    conn.execute("PRAGMA page_size=8192")
+                mode = conn.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+                if mode == "wal":
+                    StockDatabase._journal_set.add(self.db_path)
+            self.local.conn = conn
+            self.local.cursor = self.local.conn.cursor()
         return self.local.conn
     
+    def init_database(self) -> bool:
+        """初始化数据库：建立常用查询所需的索引、清理被取代的索引
+
+        会修改表结构，只应在爬虫启动等写入流程开始前显式调用一次，
+        在写锁内执行，避免与其他写入者并发修改。
+        """
+        try:
+            with self.transaction() as conn:
+                for sql in _INDEX_SQLS:
+                    conn.execute(sql)
+                # 没有统计信息时收集一次，让查询规划器能选中正确的索引
+                has_stats = conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"
+                ).fetchone()
+                if not has_stats:
+                    conn.execute("ANALYZE")
+            return True
+        except sqlite3.Error as e:
+            print(f"❌ 初始化数据库索引失败: {e}")
+            return False
+    
+    def get_cursor(self) -> sqlite3.Cursor:
+        """获取当前线程复用的游标（用于单行查询）"""
+        self.get_connection()
+        return self.local.cursor
+    
     def close_connection(self):
         """关闭当前线程的数据库连接"""
         if hasattr(self.local, 'conn') and self.local.conn is not None:
             self.local.conn.close()
             self.local.conn = None
+            self.local.cursor = None
     
     @contextmanager
     def transaction(self):
-        """事务上下文管理器"""
+        """事务上下文管理器（持有写锁）"""
         conn = self.get_connection()
-        try:
-            yield conn
-            conn.commit()
-        except Exception as e:
-            conn.rollback()
-            raise e
+        with self._write_lock:
+            try:
+                yield conn
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                raise e
     
     def insert_stock_data(self, data: Dict) -> bool:
         """插入单条股票数据"""
@@ -46,34 +224,11 @@ class StockDatabase:
             with self.transaction() as conn:
                 cursor = conn.cursor()
                 
-                insert_data = (
-                    None,
-                    datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    data["code"],
-                    data["date"],
-                    data.get("open"),
-                    data.get("high"),
-                    data.get("low"),
-                    data.get("close"),
-                    data.get("volume"),
-                    data.get("amount"),
-                    data.get("outstanding_share"),
-                    data.get("turnover"),
-                    data.get("name"),
-                    data.get("ma5"),
-                    data.get("ma10"),
-                    data.get("ma20"),
-                    data.get("rsi6"),
-                    data.get("rsi14"),
-                    data.get("pct_change"),
+                insert_data = _build_merged_row(
+                    data, datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                 )
                 
-                cursor.execute("""
-                    INSERT INTO merged_stocks 
-                    (id, created_at, code, date, open, high, low, close, volume, amount, 
-                     outstanding_share, turnover, name, ma5, ma10, ma20, rsi6, rsi14, pct_change)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, insert_data)
+                cursor.execute(_SQL_INSERT_MERGED, insert_data)
                 
                 return True
         except Exception as e:
@@ -86,69 +241,54 @@ class StockDatabase:
             with self.transaction() as conn:
                 cursor = conn.cursor()
                 
-                insert_data_list = []
-                for data in data_list:
-                    insert_data = (
-                        None,
-                        datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                        data["code"],
-                        data["date"],
-                        data.get("open"),
-                        data.get("high"),
-                        data.get("low"),
-                        data.get("close"),
-                        data.get("volume"),
-                        data.get("amount"),
-                        data.get("outstanding_share"),
-                        data.get("turnover"),
-                        data.get("name"),
-                        data.get("ma5"),
-                        data.get("ma10"),
-                        data.get("ma20"),
-                        data.get("rsi6"),
-                        data.get("rsi14"),
-                        data.get("pct_change"),
-                    )
-                    insert_data_list.append(insert_data)
+                # 同一批数据使用同一个创建时间，参数由生成器逐行提供
+                now_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                rows = (_build_merged_row(data, now_str) for data in data_list)
                 
-                cursor.executemany("""
-                    INSERT INTO merged_stocks 
-                    (id, created_at, code, date, open, high, low, close, volume, amount, 
-                     outstanding_share, turnover, name, ma5, ma10, ma20, rsi6, rsi14, pct_change)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, insert_data_list)
+                cursor.executemany(_SQL_INSERT_MERGED, rows)
                 
                 return len(data_list)
         except Exception as e:
             print(f"❌ 批量插入股票数据失败: {e}")
             return 0
     
+    def insert_stock_data_batch_async(self, data_list: List[Dict]) -> Future:
+        """在专用写线程中批量插入股票数据，返回结果为插入条数的 Future"""
+        with self._writer_init_lock:
+            if self._writer is None:
+                self._writer = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix="sqlite-writer"
+                )
+            # 写线程通过 get_connection 使用自己的线程内连接
+            return self._writer.submit(self.insert_stock_data_batch, data_list)
+    
+    def shutdown_writer(self, wait: bool = True):
+        """等待已提交的异步写入完成并关闭写线程"""
+        with self._writer_init_lock:
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            if wait:
+                # 关闭写线程自己的连接
+                writer.submit(self.close_connection).result()
+            writer.shutdown(wait=wait)
+    
     def update_stock_data(self, code: str, date: str, data: Dict) -> bool:
         """更新股票数据"""
         try:
             with self.transaction() as conn:
                 cursor = conn.cursor()
                 
-                update_fields = []
-                update_values = []
-                
-                for field in ['open', 'high', 'low', 'close', 'volume', 'amount', 
-                            'outstanding_share', 'turnover', 'name', 
-                            'ma5', 'ma10', 'ma20', 'rsi6', 'rsi14', 'pct_change']:
-                    if field in data and data[field] is not None:
-                        update_fields.append(f"{field} = ?")
-                        update_values.append(data[field])
-                
-                if not update_fields:
+                effective = {
+                    k: v for k, v in data.items()
+                    if k in UPDATE_FIELDS and v is not None
+                }
+                if not effective:
                     return False
                 
+                update_values = list(effective.values())
                 update_values.extend([code, date])
                 
-                cursor.execute(f"""
-                    UPDATE merged_stocks 
-                    SET {', '.join(update_fields)}
-                    WHERE code = ? AND date = ?
-                """, update_values)
+                cursor.execute(_build_update_sql(tuple(effective)), update_values)
                 
                 return cursor.rowcount > 0
         except Exception as e:
@@ -185,73 +325,103 @@ class StockDatabase:
             print(f"❌ 删除股票数据失败: {e}")
             return 0
     
+    @staticmethod
+    def _build_select_sql(code: str = None, date: str = None,
+                          start_date: str = None, end_date: str = None,
+                          limit: int = None, columns: Optional[List[str]] = None,
+                          ordered: bool = True) -> Tuple[str, List]:
+        """生成 merged_stocks 条件查询语句及参数
+
+        默认按日期倒序、代码排序，有 limit 时按 (date DESC, code) 索引顺序扫描并提前结束。
+        ordered=False 时省去整个结果集的排序，按索引顺序返回（不保证顺序）。
+        """
+        conditions = []
+        params = []
+        
+        if code:
+            conditions.append("code = ?")
+            params.append(code)
+        
+        if date:
+            conditions.append("date = ?")
+            params.append(date)
+        
+        if start_date:
+            conditions.append("date >= ?")
+            params.append(start_date)
+        
+        if end_date:
+            conditions.append("date <= ?")
+            params.append(end_date)
+        
+        sql = f"SELECT {_select_list(columns)} FROM merged_stocks"
+        if conditions:
+            sql += f" WHERE {' AND '.join(conditions)}"
+        
+        if ordered:
+            sql += " ORDER BY date DESC, code"
+        
+        if limit:
+            sql += f" LIMIT {limit}"
+        return sql, params
+    
     def select_stock_data(self, code: str = None, date: str = None, 
                        start_date: str = None, end_date: str = None,
-                       limit: int = None) -> List[Dict]:
-        """查询股票数据"""
+                       limit: int = None, columns: Optional[List[str]] = None,
+                       ordered: bool = True) -> List[Dict]:
+        """查询股票数据（ordered=False 时不排序）"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            conditions = []
-            params = []
-            
-            if code:
-                conditions.append("code = ?")
-                params.append(code)
-            
-            if date:
-                conditions.append("date = ?")
-                params.append(date)
-            
-            if start_date:
-                conditions.append("date >= ?")
-                params.append(start_date)
-            
-            if end_date:
-                conditions.append("date <= ?")
-                params.append(end_date)
-            
-            sql = "SELECT * FROM merged_stocks"
-            if conditions:
-                sql += f" WHERE {' AND '.join(conditions)}"
-            
-            sql += " ORDER BY date DESC, code"
-            
-            if limit:
-                sql += f" LIMIT {limit}"
-            
-            cursor.execute(sql, params)
-            rows = cursor.fetchall()
-            
-            columns = [desc[0] for desc in cursor.description]
-            return [dict(zip(columns, row)) for row in rows]
+            sql, params = self._build_select_sql(
+                code, date, start_date, end_date, limit, columns, ordered
+            )
+            cursor = self.get_connection().execute(sql, params)
+            return list(_iter_dicts(cursor))
         except Exception as e:
             print(f"❌ 查询股票数据失败: {e}")
             return []
     
-    def select_stock_data_by_codes(self, codes: List[str], date: str = None) -> List[Dict]:
+    def iter_stock_data(self, code: str = None, date: str = None,
+                        start_date: str = None, end_date: str = None,
+                        limit: int = None, columns: Optional[List[str]] = None,
+                        ordered: bool = True) -> Iterator[Dict]:
+        """逐行查询股票数据（生成器，不一次性加载全部结果）"""
+        sql, params = self._build_select_sql(
+            code, date, start_date, end_date, limit, columns, ordered
+        )
+        yield from _iter_dicts(self.get_connection().execute(sql, params))
+    
+    def select_stock_data_by_codes(self, codes: List[str], date: str = None,
+                                   columns: Optional[List[str]] = None) -> List[Dict]:
         """根据股票代码列表查询数据"""
         try:
             conn = self.get_connection()
             cursor = conn.cursor()
+            select_list = _select_list(columns, "m.")
             
-            placeholders = ','.join(['?' for _ in codes])
-            params = codes
-            
-            sql = f"SELECT * FROM merged_stocks WHERE code IN ({placeholders})"
+            if len(codes) <= _MAX_IN_CODES:
+                placeholders = ','.join(['?' for _ in codes])
+                params = list(codes)
+                sql = f"SELECT {select_list} FROM merged_stocks m WHERE m.code IN ({placeholders})"
+            else:
+                # 代码过多时写入临时表再关联，避免超出SQL参数上限
+                cursor.execute("CREATE TEMP TABLE IF NOT EXISTS _codes (code TEXT PRIMARY KEY)")
+                cursor.execute("DELETE FROM _codes")
+                cursor.executemany(
+                    "INSERT OR IGNORE INTO _codes (code) VALUES (?)",
+                    ((code,) for code in codes)
+                )
+                conn.commit()
+                params = []
+                sql = f"SELECT {select_list} FROM merged_stocks m JOIN _codes c ON m.code = c.code WHERE 1"
             
             if date:
-                sql += " AND date = ?"
+                sql += " AND m.date = ?"
                 params.append(date)
             
-            sql += " ORDER BY date DESC, code"
+            sql += " ORDER BY m.date DESC, m.code"
             
             cursor.execute(sql, params)
-            rows = cursor.fetchall()
-            
-            columns = [desc[0] for desc in cursor.description]
-            return [dict(zip(columns, row)) for row in rows]
+            return list(_iter_dicts(cursor))
         except Exception as e:
             print(f"❌ 根据代码查询股票数据失败: {e}")
             return []
@@ -259,15 +429,10 @@ class StockDatabase:
     def exists_stock_data(self, code: str, date: str) -> bool:
         """检查股票数据是否存在"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
+            cursor = self.get_cursor()
+            cursor.execute(_SQL_EXISTS, (code, date))
             
-            cursor.execute(
-                "SELECT COUNT(*) FROM merged_stocks WHERE code = ? AND date = ?",
-                (code, date)
-            )
-            
-            return cursor.fetchone()[0] > 0
+            return cursor.fetchone() is not None
         except Exception as e:
             print(f"❌ 检查股票数据存在性失败: {e}")
             return False
@@ -299,22 +464,14 @@ class StockDatabase:
             print(f"❌ 统计股票数据失败: {e}")
             return 0
     
-    def is_data_exists(self, code: str, date: str) -> bool:
-        """检查数据是否已存在"""
-        return self.get_stock_data_count(code, date) > 0
+    # 检查数据是否已存在（与 exists_stock_data 相同）
+    is_data_exists = exists_stock_data
     
     def get_stock_data(self, code: str, date: str) -> Optional[Dict]:
         """获取指定股票在指定日期的数据"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                SELECT open, high, low, close, volume
-                FROM merged_stocks
-                WHERE code = ? AND date = ?
-                LIMIT 1
-            """, (code, date))
+            cursor = self.get_cursor()
+            cursor.execute(_SQL_GET_OHLCV, (code, date))
             
             row = cursor.fetchone()
             if row:
@@ -371,10 +528,15 @@ class StockDatabase:
             with self.transaction() as conn:
                 cursor = conn.cursor()
                 
+                # UPSERT 原地更新，避免 REPLACE 的先删后插
                 cursor.execute("""
-                    INSERT OR REPLACE INTO data_status 
+                    INSERT INTO data_status 
                     (code, last_updated, record_count, status)
                     VALUES (?, ?, ?, ?)
+                    ON CONFLICT(code) DO UPDATE SET
+                        last_updated = excluded.last_updated,
+                        record_count = excluded.record_count,
+                        status = excluded.status
                 """, (code, last_updated, record_count, status))
                 
                 return True
@@ -396,9 +558,7 @@ class StockDatabase:
             else:
                 cursor.execute("SELECT * FROM data_status ORDER BY code")
             
-            rows = cursor.fetchall()
-            columns = [desc[0] for desc in cursor.description]
-            return [dict(zip(columns, row)) for row in rows]
+            return list(_iter_dicts(cursor))
         except Exception as e:
             print(f"❌ 获取数据状态失败: {e}")
             return []
@@ -409,17 +569,13 @@ class StockDatabase:
             conn = self.get_connection()
             cursor = conn.cursor()
             
-            if params:
-                cursor.execute(sql, params)
-            else:
-                cursor.execute(sql)
-            
             if sql.strip().upper().startswith('SELECT'):
-                rows = cursor.fetchall()
-                columns = [desc[0] for desc in cursor.description]
-                return [dict(zip(columns, row)) for row in rows]
+                cursor.execute(sql, params or ())
+                return list(_iter_dicts(cursor))
             else:
-                conn.commit()
+                with self._write_lock:
+                    cursor.execute(sql, params or ())
+                    conn.commit()
                 return [{'affected_rows': cursor.rowcount}]
         except Exception as e:
             print(f"❌ 执行SQL失败: {e}")
@@ -431,18 +587,18 @@ class StockDatabase:
             with self.transaction() as conn:
                 cursor = conn.cursor()
                 
-                cursor.execute(
-                    "DELETE FROM merged_stocks WHERE date = ?",
-                    (date,)
-                )
-                deleted_count = cursor.rowcount
+                # 先删除受影响股票的数据状态（子查询需要读取尚未删除的 merged_stocks）
+                cursor.execute("""
+                    WITH victims AS (SELECT code FROM merged_stocks WHERE date = ?)
+                    DELETE FROM data_status WHERE code IN victims
+                """, (date,))
                 
                 cursor.execute(
-                    "DELETE FROM data_status WHERE code IN (SELECT code FROM merged_stocks WHERE date = ?)",
+                    "DELETE FROM merged_stocks WHERE date = ?",
                     (date,)
                 )
                 
-                return deleted_count
+                return cursor.rowcount
         except Exception as e:
             print(f"❌ 清理日期数据失败: {e}")
             return 0
@@ -473,8 +629,77 @@ class StockDatabase:
             print(f"❌ 备份数据库失败: {e}")
             return False
     
+    def export_to_parquet(self, path: str, batch_size: int = 100000) -> int:
+        """将技术指标列导出为按股票代码分区的 Parquet 数据集，返回导出行数
+        
+        SQLite 负责日常读写，列式的 Parquet 用于跨日期扫描指标的分析查询。
+        """
+        conn = None
+        try:
+            import pyarrow as pa
+            import pyarrow.dataset as ds
+            
+            schema = _indicator_schema(pa)
+            # write_dataset 在 pyarrow 的工作线程中消费批次生成器，
+            # 线程内连接不能跨线程使用，导出使用独立的只读连接
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            cursor = conn.execute(
+                f"SELECT {', '.join(schema.names)} FROM merged_stocks"
+            )
+            exported = 0
+            
+            def record_batches():
+                nonlocal exported
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        return
+                    exported += len(rows)
+                    arrays = [
+                        pa.array(values, type=field.type)
+                        for values, field in zip(zip(*rows), schema)
+                    ]
+                    yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+            
+            ds.write_dataset(
+                record_batches(),
+                path,
+                schema=schema,
+                format="parquet",
+                partitioning=ds.partitioning(pa.schema([schema.field("code")])),
+                existing_data_behavior="delete_matching",
+                max_partitions=100000,
+            )
+            print(f"✅ 已导出 {exported} 条指标数据到: {path}")
+            return exported
+        except Exception as e:
+            print(f"❌ 导出Parquet失败: {e}")
+            return 0
+        finally:
+            if conn is not None:
+                conn.close()
+    
+    def scan_indicators(self, code: str, path: str):
+        """从 export_to_parquet 导出的数据集中读取单只股票的指标（pyarrow.Table）"""
+        try:
+            import pyarrow as pa
+            import pyarrow.dataset as ds
+            
+            schema = _indicator_schema(pa)
+            dataset = ds.dataset(
+                path,
+                schema=schema,
+                format="parquet",
+                partitioning=ds.partitioning(pa.schema([schema.field("code")])),
+            )
+            return dataset.to_table(filter=ds.field("code") == code).sort_by("date")
+        except Exception as e:
+            print(f"❌ 读取Parquet指标数据失败: {e}")
+            return None
+    
     def __enter__(self):
         return self
     
     def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown_writer()
         self.close_connection()
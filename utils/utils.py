@@ -1,21 +1,11 @@
 #!/usr/bin/env python3
 """实用工具模块"""
 
-import hashlib
 import sqlite3
 from datetime import datetime
 from typing import Dict, Any, Optional
 
-
-# 安全的哈希函数，处理可能的缺失算法
-def safe_md5(data: str) -> str:
-    """安全的MD5哈希函数，处理编码问题"""
-    try:
-        return hashlib.md5(data.encode("utf-8")).hexdigest()
-    except Exception as e:
-        # 如果MD5不可用，使用简单的哈希作为备选（虽然安全性较低）
-        print(f"警告: MD5哈希失败，使用备选方案: {e}")
-        return str(hash(data))[:32]
+from .deduplication import safe_md5
 
 
 class DeduplicationManager: